@@ -0,0 +1,144 @@
+# streamlit/aggregate_store.py
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+import pandas as pd
+from config import AGGREGATE_STORE_DIR, COST_BUDGET_COL, COST_DATE_COL, COST_VALUE_COL
+from schema import plain
+
+GROUP_KEYS = [COST_BUDGET_COL, COST_DATE_COL]
+
+
+def period_fingerprints(filtered: pd.DataFrame) -> pd.Series:
+    # One order-independent checksum per DecisionMoment: row count plus the
+    # wrapping sum of the row hashes. Equal fingerprints mean the period's rows
+    # are unchanged and its stored partial sums can be reused.
+    rows = filtered[GROUP_KEYS + [COST_VALUE_COL]]
+    hashes = pd.util.hash_pandas_object(rows, index=False)
+    # Categorical columns hash like their values, so the checksum does not
+    # depend on which other categories an upload happens to contain
+    grouped = hashes.groupby(plain(rows[COST_DATE_COL]).to_numpy(), sort=False)
+    return (
+        grouped.size().astype(str) + ":" + grouped.sum().astype(str)
+    ).rename("fingerprint")
+
+
+def group_costs(filtered: pd.DataFrame) -> pd.DataFrame:
+    grouped = (
+        filtered
+        .groupby(GROUP_KEYS, observed=True)[COST_VALUE_COL]
+        .sum()
+        .reset_index()
+    )
+    # Grouped rows are few; keep plain keys so partials from different uploads
+    # (with different category sets) concatenate cleanly
+    return grouped.assign(**{col: plain(grouped[col]) for col in GROUP_KEYS})
+
+
+def merge_partials(*partials: pd.DataFrame) -> pd.DataFrame:
+    # Partial sums are additive, so merging is a concat followed by a regroup
+    # over the (already small) aggregated rows
+    partials = [p for p in partials if len(p)]
+    if not partials:
+        return pd.DataFrame(columns=GROUP_KEYS + [COST_VALUE_COL])
+    return group_costs(pd.concat(partials, ignore_index=True))
+
+
+def ledger_id(names: list, budget_codes: pd.Series = None) -> str:
+    # Stable id of a ledger across uploads: its (sorted) file names plus the
+    # projects it covers. Two missions uploading the same file name (e.g.
+    # 'export.xlsx') get different ids, while a re-upload of an edited
+    # workbook with the same projects reuses the unchanged periods.
+    files = sorted(str(n).strip().lower() for n in names)
+    projects = sorted(str(c) for c in pd.unique(budget_codes.dropna())) if budget_codes is not None else []
+    key = "\n".join(files) + "\0" + "\n".join(projects)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _partition_name(period) -> str:
+    return hashlib.sha256(str(period).encode("utf-8")).hexdigest()[:16] + ".parquet"
+
+
+class PartialAggregateStore:
+    # Persistent (BudgetCode, DecisionMoment) cost sums per ledger, one Parquet
+    # file per period plus a fingerprint table. Each update only regroups
+    # periods whose fingerprint is new or changed and rewrites those files;
+    # the other periods are read back as stored.
+
+    def __init__(self, directory: str = AGGREGATE_STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _ledger_dir(self, ledger: str) -> str:
+        return os.path.join(self.directory, ledger)
+
+    def _fingerprints_path(self, ledger: str) -> str:
+        return os.path.join(self._ledger_dir(ledger), "fingerprints.parquet")
+
+    def _write(self, path: str, df: pd.DataFrame) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def fingerprints(self, ledger: str) -> pd.Series:
+        path = self._fingerprints_path(ledger)
+        if not os.path.exists(path):
+            return pd.Series(dtype=str, name="fingerprint").rename_axis(COST_DATE_COL)
+        return pd.read_parquet(path).set_index(COST_DATE_COL)["fingerprint"]
+
+    def _write_fingerprints(self, ledger: str, stored: pd.Series) -> None:
+        self._write(self._fingerprints_path(ledger), stored.rename_axis(COST_DATE_COL).reset_index())
+
+    def _read_periods(self, ledger: str, periods) -> pd.DataFrame:
+        paths = [os.path.join(self._ledger_dir(ledger), _partition_name(p)) for p in periods]
+        parts = [pd.read_parquet(path) for path in paths if os.path.exists(path)]
+        return merge_partials(*parts) if parts else pd.DataFrame(columns=GROUP_KEYS + [COST_VALUE_COL])
+
+    def update(self, ledger: str, filtered: pd.DataFrame) -> tuple:
+        # Fold an already filtered cost frame into the ledger's sums. Returns
+        # (sums for the frame's periods, periods that had to be recomputed);
+        # both happen under one lock so concurrent jobs cannot interleave.
+        with self._lock:
+            current = period_fingerprints(filtered)
+            stored = self.fingerprints(ledger)
+            changed = current.index[current.ne(stored.reindex(current.index))]
+            if len(changed):
+                fresh = group_costs(filtered[plain(filtered[COST_DATE_COL]).isin(changed)])
+                parts = dict(list(fresh.groupby(COST_DATE_COL, sort=False, observed=True)))
+                for period in changed:
+                    path = os.path.join(self._ledger_dir(ledger), _partition_name(period))
+                    if period in parts:
+                        self._write(path, parts[period])
+                    elif os.path.exists(path):
+                        # No groupable rows left in this period
+                        os.remove(path)
+                stored = pd.concat([stored.drop(changed, errors="ignore"), current.loc[changed]])
+                self._write_fingerprints(ledger, stored)
+            grouped = self._read_periods(ledger, current.index)
+            return grouped.sort_values(GROUP_KEYS).reset_index(drop=True), list(changed)
+
+    def invalidate(self, ledger: str = None, periods=None) -> None:
+        # Forget some periods of a ledger, a whole ledger, or everything, so
+        # the next update recomputes them
+        with self._lock:
+            if ledger is None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+            elif periods is None:
+                shutil.rmtree(self._ledger_dir(ledger), ignore_errors=True)
+            else:
+                for period in periods:
+                    path = os.path.join(self._ledger_dir(ledger), _partition_name(period))
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._write_fingerprints(ledger, self.fingerprints(ledger).drop(periods, errors="ignore"))
@@ -0,0 +1,340 @@
+# streamlit/api_server.py
+#
+# Read-only HTTP API over the coefficient store, for tools that need rates or
+# holding cost estimates without the Streamlit app. Run from the project root:
+#
+#   python api_server.py --port 8502
+#
+#   GET  /health
+#   GET  /sets                                       coefficient sets, newest first
+#   GET  /sets/<id>/coefficients[?codes=AO101,...]   per-project and summary rates
+#   POST /sets/<id>/holding-costs                    batch holding cost estimates
+#
+# <id> is a set id from /sets or 'default'. A holding-cost request body is
+#   {"rates": "MEDIAN", "projects": [{"BudgetCode": "AO101", "TotalValueCHF": 1200.0,
+#                                     "TotalVolumeM3": 3.5, "TotalWeightKG": 410.0}, ...]}
+# where rates is a summary row (MEAN, MEDIAN, ...) or "project" for each
+# project's own rates (falling back to MEDIAN for projects not in the set).
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+from budget_keys import canonical_code
+from coefficient_engine import ROUNDED_COLS
+from coefficient_store import SUMMARY_STATS, CoefficientStore
+from config import (
+    API_HOST, API_MAX_BATCH, API_MAX_BODY_BYTES, API_PORT, API_RESPONSE_CACHE_MAX_BYTES, API_TOKEN_ENV,
+    COEFFICIENT_DB_PATH, COST_BUDGET_COL, DEFAULT_COEFFICIENTS_PATH,
+)
+from cost_model import HOLDING_COST_BASES
+from downloads import PayloadCache
+
+logger = logging.getLogger("msf_tool.api")
+
+# Inventory total -> rate column, in the order of the holding cost columns
+_TOTALS = [total for total, _ in HOLDING_COST_BASES.values()]
+_RATES = [rate for _, rate in HOLDING_COST_BASES.values()]
+
+
+class ApiError(Exception):
+    # Answered as {"error": message} with the given status
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RateIndex:
+    # One coefficient set in memory: per-project rates keyed by canonical
+    # BudgetCode plus the summary rows. Sets are immutable once stored, so
+    # an index never needs refreshing.
+
+    def __init__(self, set_id: int, table: pd.DataFrame):
+        self.set_id = set_id
+        is_summary = table[COST_BUDGET_COL].isin(SUMMARY_STATS).to_numpy()
+        projects = table[~is_summary]
+        self.codes = pd.Index(projects[COST_BUDGET_COL].map(canonical_code).fillna(projects[COST_BUDGET_COL]))
+        self.values = projects[ROUNDED_COLS].to_numpy(dtype=np.float64)
+        self.rates = projects[_RATES].to_numpy(dtype=np.float64)
+        self.summaries = {
+            stat: row for stat, row in zip(table.loc[is_summary, COST_BUDGET_COL], table.loc[is_summary, ROUNDED_COLS].to_numpy(dtype=np.float64))
+        }
+
+    def positions(self, codes: list) -> np.ndarray:
+        # Row per requested code, -1 where the set has no such project
+        canonical = [canonical_code(c) or str(c).strip() for c in codes]
+        return self.codes.get_indexer(canonical)
+
+    def summary_rates(self, stat: str) -> np.ndarray:
+        row = self.summaries.get(stat)
+        if row is None or np.isnan(row).all():
+            raise ApiError(HTTPStatus.NOT_FOUND, f"coefficient set {self.set_id} has no {stat} row")
+        return row[[ROUNDED_COLS.index(rate) for rate in _RATES]]
+
+
+def _records(columns: list, *arrays) -> list:
+    # Column arrays -> list of JSON objects; NaN becomes null
+    rows = zip(*(a.tolist() for a in arrays))
+    return [
+        {col: (None if isinstance(v, float) and v != v else v) for col, v in zip(columns, row)}
+        for row in rows
+    ]
+
+
+def _json(payload) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class CoefficientService:
+    # Everything the handlers need: set lookup, the loaded rate indexes and
+    # a cache of serialised responses keyed by their ETag, bounded in bytes
+    # (one full batch of holding costs is over 20 MB)
+
+    def __init__(self, store: CoefficientStore, default_path: str = DEFAULT_COEFFICIENTS_PATH,
+                 cache_bytes: int = API_RESPONSE_CACHE_MAX_BYTES):
+        self.store = store
+        self.default_set_id = store.import_csv(default_path, label="Default MSF coefficients")
+        self.responses = PayloadCache(cache_bytes)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name: str) -> int:
+        if name == "default":
+            return self.default_set_id
+        try:
+            return int(name)
+        except ValueError:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"unknown coefficient set '{name}'") from None
+
+    def index(self, set_id: int) -> RateIndex:
+        index = self._indexes.get(set_id)
+        if index is None:
+            table = self.store.load_table(set_id)
+            if table.empty:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"unknown coefficient set {set_id}")
+            index = RateIndex(set_id, table)
+            with self._lock:
+                index = self._indexes.setdefault(set_id, index)
+        return index
+
+    def sets(self) -> dict:
+        sets = self.store.list_sets()
+        return {"default": self.default_set_id, "sets": sets.to_dict("records")}
+
+    def coefficients(self, set_id: int, codes: list = None) -> dict:
+        index = self.index(set_id)
+        positions = np.arange(len(index.codes)) if codes is None else index.positions(codes)
+        found = positions >= 0
+        rows = index.values[positions[found]]
+        return {
+            "set_id": set_id,
+            "summaries": {stat: _records(ROUNDED_COLS, *row[:, None])[0] for stat, row in index.summaries.items()},
+            "projects": _records([COST_BUDGET_COL] + ROUNDED_COLS, index.codes[positions[found]].to_numpy(), *rows.T),
+            "unmatched": [c for c, ok in zip(codes or [], found) if not ok],
+        }
+
+    def holding_costs(self, set_id: int, request: dict) -> dict:
+        # Every project in one NumPy product: totals (projects x bases) times
+        # rates (one summary row, or one row per project)
+        projects = request.get("projects")
+        if not isinstance(projects, list) or not projects:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'projects' must be a non-empty list")
+        if len(projects) > API_MAX_BATCH:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"at most {API_MAX_BATCH} projects per request")
+        mode = str(request.get("rates", "MEDIAN")).upper()
+        if mode != "PROJECT" and mode not in SUMMARY_STATS:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"'rates' must be 'project' or one of {', '.join(SUMMARY_STATS)}")
+
+        try:
+            codes = [str(p[COST_BUDGET_COL]) for p in projects]
+            totals = np.array([[p.get(total) for total in _TOTALS] for p in projects], dtype=np.float64)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"every project needs BudgetCode and numeric totals ({e})") from None
+
+        index = self.index(set_id)
+        unmatched = []
+        if mode == "PROJECT":
+            positions = index.positions(codes)
+            found = positions >= 0
+            # Only found rows index the project rates, which may be empty (a set
+            # of summary rows only); everything else uses MEDIAN
+            rates = np.tile(index.summary_rates("MEDIAN"), (len(codes), 1))
+            rates[found] = index.rates[positions[found]]
+            sources = np.where(found, "project", "MEDIAN")
+            unmatched = [c for c, ok in zip(codes, found) if not ok]
+        else:
+            rates = index.summary_rates(mode)
+            sources = np.full(len(codes), mode)
+        costs = (totals * rates).round(2)
+
+        columns = [COST_BUDGET_COL] + _TOTALS + list(HOLDING_COST_BASES) + ["RateSource"]
+        labels = np.array([canonical_code(c) or c.strip() for c in codes], dtype=object)
+        return {
+            "set_id": set_id,
+            "rates": mode.lower() if mode == "PROJECT" else mode,
+            "projects": _records(columns, labels, *totals.round(2).T, *costs.T, sources),
+            "unmatched": unmatched,
+        }
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests, which matters far more
+    # for throughput than anything in the handlers themselves
+    protocol_version = "HTTP/1.1"
+    # Headers and body leave in one write, without waiting on Nagle's algorithm
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+    server_version = "msf-tool-api"
+    service = None
+    token = None
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format, *args)
+
+    def _send(self, status: HTTPStatus, body: bytes = b"", etag: str = None) -> None:
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            # Clients may keep the response but must revalidate it with If-None-Match
+            self.send_header("Cache-Control", "no-cache")
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: HTTPStatus, message: str) -> None:
+        self._send(status, _json({"error": message}))
+
+    def _authorised(self) -> bool:
+        if not self.token:
+            return True
+        given = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        return hmac.compare_digest(given.encode("utf-8"), self.token.encode("utf-8"))
+
+    def _read_body(self) -> bytes:
+        # A body that is not read (bad length, too large, unauthorised) would be
+        # taken for the next request, so those answers close the connection
+        length = self.headers.get("Content-Length") or "0"
+        if not (length.isascii() and length.isdigit()):
+            self.close_connection = True
+            raise ApiError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if int(length) > API_MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"body larger than {API_MAX_BODY_BYTES} bytes")
+        return self.rfile.read(int(length))
+
+    def _not_modified(self, etag: str) -> bool:
+        if etag not in self.headers.get("If-None-Match", ""):
+            return False
+        self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+        return True
+
+    def _respond(self, etag: str, build) -> None:
+        # ETags are derived from the request (stored sets never change), so a
+        # revalidation or a repeated request is answered without recomputing
+        if self._not_modified(etag):
+            return
+        body = self.service.responses.get(etag, lambda: _json(build()))
+        self._send(HTTPStatus.OK, body, etag)
+
+    def _handle(self, method: str) -> None:
+        # The token is checked before any of the body is read
+        if not self._authorised():
+            self.close_connection = True
+            self._error(HTTPStatus.UNAUTHORIZED, "missing or wrong bearer token")
+            return
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            raw = self._read_body()
+            if method == "GET" and parts == ["health"]:
+                self._send(HTTPStatus.OK, b'{"status":"ok"}')
+            elif method == "GET" and parts == ["sets"]:
+                # New sets can appear, so this ETag comes from the content
+                body = _json(self.service.sets())
+                etag = '"s-' + hashlib.sha256(body).hexdigest()[:32] + '"'
+                if not self._not_modified(etag):
+                    self._send(HTTPStatus.OK, body, etag)
+            elif len(parts) == 3 and parts[0] == "sets" and parts[2] == "coefficients" and method == "GET":
+                set_id = self.service.resolve(parts[1])
+                query = parse_qs(url.query).get("codes")
+                codes = [c for c in ",".join(query).split(",") if c.strip()] if query else None
+                digest = hashlib.sha256(",".join(codes or ["*"]).encode("utf-8")).hexdigest()[:32]
+                self._respond(f'"c{set_id}-{digest}"', lambda: self.service.coefficients(set_id, codes))
+            elif len(parts) == 3 and parts[0] == "sets" and parts[2] == "holding-costs" and method == "POST":
+                set_id = self.service.resolve(parts[1])
+                digest = hashlib.sha256(raw).hexdigest()[:32]
+
+                def build() -> dict:
+                    try:
+                        request = json.loads(raw)
+                    except ValueError:
+                        raise ApiError(HTTPStatus.BAD_REQUEST, "body must be JSON") from None
+                    if not isinstance(request, dict):
+                        raise ApiError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+                    return self.service.holding_costs(set_id, request)
+
+                self._respond(f'"h{set_id}-{digest}"', build)
+            else:
+                self._error(HTTPStatus.NOT_FOUND, f"no route for {method} {url.path}")
+        except ApiError as e:
+            self._error(e.status, str(e))
+        except Exception:
+            logger.exception("request failed: %s %s", method, self.path)
+            self._error(HTTPStatus.INTERNAL_SERVER_ERROR, "internal error")
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+
+def make_server(host: str = API_HOST, port: int = API_PORT, db_path: str = COEFFICIENT_DB_PATH,
+                token: str = None) -> ThreadingHTTPServer:
+    handler = type("Handler", (ApiHandler,), {
+        "service": CoefficientService(CoefficientStore(db_path)),
+        "token": token,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="HTTP API for coefficient sets and holding cost estimates.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT, help="0 picks a free port")
+    parser.add_argument("--db", default=COEFFICIENT_DB_PATH, help="Coefficient store (SQLite)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = make_server(args.host, args.port, args.db, os.environ.get(API_TOKEN_ENV))
+    host, port = server.server_address[:2]
+    # The load test reads this line to find the port
+    print(f"Serving on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
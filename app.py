@@ -1,13 +1,27 @@
 import streamlit as st
-import pandas as pd
 import os
-from PIL import Image
-from datetime import datetime
-from data_loader import load_excel
-from cost_model import filter_and_group_costs, summarize_annual_costs
+import time
+from config import (
+    ANNUALIZATION_DIVISOR, COEFFICIENT_YEARS, DEFAULT_COEFFICIENTS_PATH, IQR_FILTER_MODE, JOB_POLL_SECONDS,
+    ROLLING_WINDOW_MONTHS, STARTUP_BUDGET_SECONDS,
+)
+from instrumentation import add_records, configure_logging, record_budget, records, stage, start_run
 
-logo = Image.open("assets/logo.png")
-st.image(logo, width=200)  # Adjust width as needed
+script_start = time.perf_counter()
+
+# Everything above the login form only needs Streamlit; pandas and the tab
+# modules are imported once the user is authenticated.
+
+def file_version(path: str) -> int:
+    # Part of the cache key for files loaded once per server, so edits are picked up
+    return os.stat(path).st_mtime_ns
+
+@st.cache_resource
+def get_logo(version: int) -> bytes:
+    with open("assets/logo.png", "rb") as f:
+        return f.read()
+
+st.image(get_logo(file_version("assets/logo.png")), width=200)  # Adjust width as needed
 
 st.title("MSF Inventory Holding Cost Tool")
 
@@ -27,66 +41,215 @@ if not st.session_state["authenticated"]:
             st.error("Invalid credentials")
     st.stop()
 
+# Stage timings for this rerun go to the log and the optional diagnostics panel
+configure_logging()
+start_run()
+with stage("imports"):
+    import io
+    import uuid
+    import pandas as pd
+    from data_loader import load_inventory_files
+    from cost_model import estimate_holding_costs
+    from aggregate_store import PartialAggregateStore
+    from coefficient_engine import aggregate_inventory
+    from ingest_cache import cache_key, invalidate, load_cached, read_upload_bytes, file_digest
+    from jobs import COEFFICIENT_STEPS, COST_OVERVIEW_STEPS, JobRunner, coefficient_job, cost_overview_job
+    from downloads import FORMATS, export_formats, lazy_payload
+    from coefficient_store import CoefficientStore, SUMMARY_STATS, input_hash
+    from scenario_engine import BASES, DEFAULT_PERCENTILES, pivot_scenarios, run_scenarios, scenario_rates
+    from coefficient_engine import ENGINE_VERSION
+    from budget_keys import KeyIndex
+    from monthly_series import monthly_inventory, rolling_holding_costs
+    from robust_stats import IQR_MODES
+
+# Script start to here: the first authenticated run pays for the imports
+record_budget("startup", time.perf_counter() - script_start, STARTUP_BUDGET_SECONDS)
+
 st.success("Logged in successfully.")
 
+show_diagnostics = st.sidebar.checkbox("Show diagnostics")
+
+# Parsed uploads are cached on disk across reruns and sessions
+if st.sidebar.button("Clear upload cache"):
+    invalidate()
+    st.sidebar.success("Upload cache cleared.")
+
+@st.cache_resource
+def get_aggregate_store() -> PartialAggregateStore:
+    # One store per server process so concurrent sessions share the same lock
+    return PartialAggregateStore()
+
+@st.cache_resource
+def get_coefficient_store() -> CoefficientStore:
+    return CoefficientStore()
+
+@st.cache_resource
+def get_default_coefficients(version: int) -> pd.DataFrame:
+    # Parsed once per server process; the parsed table is kept as Arrow in the
+    # ingest cache, so a restarted server memory-maps it instead of re-reading the CSV
+    data = read_upload_bytes(DEFAULT_COEFFICIENTS_PATH)
+    return load_cached(cache_key(file_digest(data), "default_coefficients"), lambda: pd.read_csv(io.BytesIO(data)))
+
+@st.cache_resource
+def get_default_set_id(version: int) -> int:
+    return get_coefficient_store().import_csv(DEFAULT_COEFFICIENTS_PATH, label="Default MSF coefficients")
+
+@st.cache_resource
+def get_manual(path: str, version: int) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+@st.cache_resource
+def get_dev_manual_sections(version: int) -> tuple:
+    # (intro, project tree, rest), split once per server process
+    md = get_manual("docs/dev_manual.md", version)
+    split_section = "Project structure"
+    parts = md.split(split_section)
+    intro = parts[0] + f"## {split_section}"
+    if len(parts) == 1:
+        return intro, None, None
+
+    # Get only the tree block (between "Project structure" and "---")
+    tree_block = parts[1].split("---")[0].strip()
+    rest = "---\n" + parts[1].split("---", 1)[1] if "---" in parts[1] else None
+    return intro, tree_block, rest
+
+@st.cache_resource
+def get_job_runner() -> JobRunner:
+    # Shared by all sessions, so identical uploads are computed once
+    return JobRunner()
+
+def session_id() -> str:
+    return st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+def uploads(files: list) -> list:
+    # (file name, bytes) pairs, the form background jobs take uploads in
+    return [(f.name, read_upload_bytes(f)) for f in files]
+
+def uploads_digest(files: list) -> str:
+    return "+".join(file_digest(read_upload_bytes(f)) for f in files)
+
+def source_report(report: pd.DataFrame) -> None:
+    # Which files and sheets were read, and the rows dropped as repeats of earlier ones
+    duplicates = int(report["Duplicates"].sum())
+    if duplicates:
+        st.warning(f"{duplicates} rows appeared in more than one file or sheet and were counted once.")
+    if len(report) > 1 or duplicates:
+        with st.expander(f"Read {len(report)} sheets"):
+            st.dataframe(report, hide_index=True)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(key: str) -> None:
+    # Polls the running job without rerunning the page; once it has finished a
+    # full rerun renders the result
+    runner = get_job_runner()
+    job = runner.get(key)
+    if job is None or job.done:
+        st.rerun()
+    if job.status == "queued":
+        text = "Waiting for a free worker..."
+    else:
+        text = job.step_name if job.stage is None else f"{job.step_name} ({job.stage})"
+    st.progress(job.progress, text=text)
+    if st.button("Cancel", key=f"cancel_{key}"):
+        runner.cancel(key, session_id())
+        st.session_state.setdefault("cancelled_jobs", set()).add(key)
+        st.rerun()
+
+def background_result(key: str, fn, *args, steps: list, error_message: str):
+    # Result of a background job once it is done, otherwise None while a
+    # progress bar (or the failure) is shown. Widget changes while the job runs
+    # just find it again instead of restarting it.
+    runner = get_job_runner()
+    cancelled = st.session_state.setdefault("cancelled_jobs", set())
+    job = None if key in cancelled else runner.submit(key, fn, *args, steps=steps, watcher=session_id())
+    if job is not None and job.status == "done":
+        add_records(job.records)
+        return job.result
+    if job is None or job.done:
+        if job is not None and job.status == "failed":
+            st.error(f"{error_message}: {job.error}")
+        else:
+            st.info("Processing was cancelled.")
+        if st.button("Run again", key=f"retry_{key}"):
+            cancelled.discard(key)
+            runner.forget(key)
+            st.rerun()
+        return None
+    job_progress(key)
+    return None
+
+@st.cache_resource(max_entries=4)
+def get_scenarios(inventory_digest: str, rate_set_id: int, percentiles: tuple, include_projects: bool,
+                  _inv_summary: pd.DataFrame) -> pd.DataFrame:
+    # All projects x scenarios x bases for one inventory upload and coefficient
+    # set; filtering and pivoting below reuse this result
+    store = get_coefficient_store()
+    scenarios = scenario_rates(
+        store.load_rows(rate_set_id),
+        {stat: store.summary(rate_set_id, stat) for stat in SUMMARY_STATS},
+        list(percentiles),
+        include_projects,
+    )
+    return run_scenarios(_inv_summary, scenarios)
+
+@st.cache_resource(max_entries=4)
+def get_monthly_inventory(inventory_digest: str, _inventory_df: pd.DataFrame):
+    # Dense project x month inventory totals; every rolling window is derived from it
+    return monthly_inventory(_inventory_df)
+
+def download_button(label: str, df: pd.DataFrame, file_stem: str, key: str) -> None:
+    # The payload is only serialised when the button is clicked, and then cached
+    # by content hash; large tables can be downloaded in compact formats
+    formats = export_formats(df)
+    fmt = formats[0]
+    if len(formats) > 1:
+        fmt = st.selectbox("Download format", formats, key=f"{key}_format")
+    extension, mime = FORMATS[fmt]
+    st.download_button(
+        label=label,
+        data=lazy_payload(df, fmt),
+        file_name=file_stem + extension,
+        mime=mime,
+        key=key,
+        on_click="ignore",
+    )
+
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["Warehouse cost overview", "Cost rate calculator", "Holding cost estimator", "Developer manual", "User manual"])
 
 with tab1:
 
     # File upload
-    cost_file = st.file_uploader("Upload cost excel file", type=["xlsx"])
-    if cost_file:
-        with st.spinner("Processing cost data..."):
-            try:
-                cost_df = load_excel(cost_file)
-                grouped_df = filter_and_group_costs(cost_df)
-                annual_summary = summarize_annual_costs(grouped_df)
-
-                st.success("Cost file loaded and processed successfully.")
+    cost_files = st.file_uploader("Upload cost excel files", type=["xlsx"], accept_multiple_files=True)
+    if cost_files:
+        try:
+            overview = background_result(
+                f"cost_overview:{uploads_digest(cost_files)}", cost_overview_job, uploads(cost_files), get_aggregate_store(),
+                steps=COST_OVERVIEW_STEPS, error_message="Failed to process file",
+            )
+            if overview is not None:
+                grouped_df = overview["grouped"]
+                annual_summary = overview["annual"]
+                cube = overview["cube"]
+
+                st.success("Cost data loaded and processed successfully.")
+                source_report(overview["sources"])
                 st.subheader("Annual cost summary by project")
                 st.dataframe(annual_summary)
 
                 st.subheader("Monthly cost breakdown")
                 st.write(f"{len(grouped_df)} records grouped by BudgetCode and month.")
                 st.dataframe(grouped_df.head(50))
-                st.download_button("Download full data", grouped_df.to_csv(index=False), file_name="monthly_costs.csv")
+                download_button("Download full data", grouped_df, "monthly_costs", key="monthly_costs")
                 
                 st.subheader("Explore cost categories by project and year")
 
                 # Dropdown selectors
-                cost_df["Year"] = cost_df["DecisionMoment"].str.slice(0, 4)
+                selected_budget = st.selectbox("Select BudgetCode", cube.budget_options)
+                selected_year = st.selectbox("Select Year", cube.year_options)
 
-                budget_options = sorted(
-                    b for b in cost_df["BudgetCode"].dropna().unique()
-                    if b.strip().upper() != "TOTAL"
-                )
-                year_options = sorted(cost_df["Year"].dropna().unique())
-
-                selected_budget = st.selectbox("Select BudgetCode", budget_options)
-                selected_year = st.selectbox("Select Year", year_options)
-
-                # Filter by budget and year (and actuals if available)
-                if "Actuals/forecast" in cost_df.columns:
-                    filtered = cost_df[
-                        (cost_df["BudgetCode"] == selected_budget) &
-                        (cost_df["Year"] == selected_year) &
-                        (cost_df["Actuals/forecast"].str.lower() == "actuals")
-                    ]
-                else:
-                    filtered = cost_df[
-                        (cost_df["BudgetCode"] == selected_budget) &
-                        (cost_df["Year"] == selected_year)
-                    ]
-
-                # Group by cost category
-                category_breakdown = (
-                    filtered
-                    .groupby("whatLVL1Desc")["Total CHF"]
-                    .sum()
-                    .reset_index()
-                    .sort_values(by="Total CHF", ascending=False)
-                    .rename(columns={"whatLVL1Desc": "Cost category"})
-                )
+                # Category totals are precomputed per (BudgetCode, Year), so this is a lookup
+                category_breakdown = cube.breakdown(selected_budget, selected_year)
 
                 # Display
                 st.markdown(f"**Cost breakdown for {selected_budget} in {selected_year}**")
@@ -94,11 +257,11 @@ with tab1:
 
 
                 # Download button
-                st.download_button(
-                    label="Download category breakdown as CSV",
-                    data=category_breakdown.to_csv(index=False),
-                    file_name=f"{selected_budget}_{selected_year}_categories.csv",
-                    mime="text/csv"
+                download_button(
+                    "Download category breakdown as CSV",
+                    category_breakdown,
+                    f"{selected_budget}_{selected_year}_categories",
+                    key="category_breakdown",
                 )
 
 
@@ -107,9 +270,9 @@ with tab1:
                 
 
 
-            except Exception as e:
-                st.error(f"Failed to process file: {e}")
-                
+        except Exception as e:
+            st.error(f"Failed to process file: {e}")
+            
 with tab2:
             st.header("Cost rate calculator")
 
@@ -118,185 +281,129 @@ with tab2:
             if not use_custom:
                 st.markdown("Using **default cost coefficients** based on existing MSF data.")
                 try:
-                    default_path = os.path.join("data", "default_cost_coefficients.csv")
-                    default_df = pd.read_csv(default_path)
+                    default_df = get_default_coefficients(file_version(DEFAULT_COEFFICIENTS_PATH))
 
                     st.dataframe(default_df)
 
-                    st.download_button(
-                        label="Download default cost coefficients",
-                        data=default_df.to_csv(index=False),
-                        file_name="default_cost_coefficients.csv",
-                        mime="text/csv"
+                    download_button(
+                        "Download default cost coefficients",
+                        default_df,
+                        "default_cost_coefficients",
+                        key="default_coefficients",
                     )
                 except FileNotFoundError:
                     st.error("Default coefficient file not found. Please ensure it's placed in `data/`.")
             else:
                 st.markdown("Upload your own data to **calculate new cost coefficients**.")
-                sim_cost_file = st.file_uploader("Upload cost data", type=["xlsx"], key="sim_cost_file")
-                sim_inventory_file = st.file_uploader("Upload inventory data", type=["xlsx"], key="sim_inventory_file")
-
-                if sim_cost_file and sim_inventory_file:
-                    with st.spinner("Processing your files..."):
-                        try:
-                            cost_df = pd.read_excel(sim_cost_file)
-                            inv_df = pd.read_excel(sim_inventory_file)
-
-                            # Cost filtering
-                            cost_df["Year"] = cost_df["DecisionMoment"].astype(str).str[:4]
-                            cost_df = cost_df[cost_df["Year"].isin(["2023", "2024"])]
-                            if "Actuals/forecast" in cost_df.columns:
-                                cost_df = cost_df[cost_df["Actuals/forecast"].str.lower() == "actuals"]
-                            cost_df["Total CHF"] = pd.to_numeric(cost_df["Total CHF"], errors="coerce")
-
-                            cost_agg = cost_df.groupby("BudgetCode")["Total CHF"].sum().reset_index()
-                            cost_agg["AvgAnnualCostCHF"] = cost_agg["Total CHF"] / 2
-
-                            # Inventory filtering
-                            inv_df["actual_delivery_date"] = pd.to_datetime(inv_df["actual_delivery_date"], errors="coerce")
-                            inv_df = inv_df[inv_df["actual_delivery_date"].astype(str).str.startswith(("2023", "2024"))]
-                            inv_df["Year"] = inv_df["actual_delivery_date"].astype(str).str[:4]
-                            inv_df["BudgetCode"] = inv_df["project_id"].astype(str).str[:-3]
-
-                            inv_df["price_orderline"] = pd.to_numeric(inv_df["price_orderline"], errors="coerce")
-                            inv_df["order_volume_m3"] = pd.to_numeric(inv_df["order_volume_m3"], errors="coerce")
-                            inv_df["order_weight_kg"] = pd.to_numeric(inv_df["order_weight_kg"], errors="coerce")
-
-                            inv_agg = inv_df.groupby("BudgetCode").agg(
-                                TotalValueCHF=("price_orderline", "sum"),
-                                TotalVolumeM3=("order_volume_m3", "sum"),
-                                TotalWeightKG=("order_weight_kg", "sum")
-                            ).reset_index()
-
-                            merged = pd.merge(
-                                cost_agg[["BudgetCode", "AvgAnnualCostCHF"]],
-                                inv_agg,
-                                on="BudgetCode",
-                                how="inner"
+                sim_cost_files = st.file_uploader(
+                    "Upload cost data", type=["xlsx"], key="sim_cost_file", accept_multiple_files=True
+                )
+                sim_inventory_files = st.file_uploader(
+                    "Upload inventory data", type=["xlsx"], key="sim_inventory_file", accept_multiple_files=True
+                )
+                iqr_mode = st.selectbox(
+                    "Outlier filter",
+                    IQR_MODES,
+                    index=IQR_MODES.index(IQR_FILTER_MODE),
+                    help="sequential: filter CHF/Value, then CHF/m3, then CHF/kg on what is left. "
+                         "joint: drop projects outside the IQR range of any coefficient, all computed on the full data.",
+                )
+
+                if sim_cost_files and sim_inventory_files:
+                    try:
+                        # Identical uploads map to the same stored coefficient set
+                        store = get_coefficient_store()
+                        set_key = input_hash(
+                            "custom_cost_coefficients", ENGINE_VERSION, COEFFICIENT_YEARS, ANNUALIZATION_DIVISOR, iqr_mode,
+                            uploads_digest(sim_cost_files),
+                            uploads_digest(sim_inventory_files),
+                        )
+                        set_id = store.find(set_key)
+                        if set_id is None:
+                            set_id = background_result(
+                                set_key, coefficient_job,
+                                uploads(sim_cost_files), uploads(sim_inventory_files), iqr_mode, store, set_key,
+                                " + ".join(f.name for f in sim_cost_files + sim_inventory_files),
+                                steps=COEFFICIENT_STEPS, error_message="Error processing your data",
                             )
 
-                            # Compute coefficients
-                            merged["CHF_per_Value"] = merged["AvgAnnualCostCHF"] / merged["TotalValueCHF"]
-                            merged["CHF_per_m3"] = merged["AvgAnnualCostCHF"] / merged["TotalVolumeM3"]
-                            merged["CHF_per_kg"] = merged["AvgAnnualCostCHF"] / merged["TotalWeightKG"]
-
-                            # Drop NaNs
-                            merged = merged.dropna()
-
-                            # Apply IQR filtering
-                            def iqr_filter(df, col):
-                                Q1 = df[col].quantile(0.25)
-                                Q3 = df[col].quantile(0.75)
-                                IQR = Q3 - Q1
-                                return df[(df[col] >= Q1 - 1.5 * IQR) & (df[col] <= Q3 + 1.5 * IQR)]
-
-                            for col in ["CHF_per_Value", "CHF_per_m3", "CHF_per_kg"]:
-                                merged = iqr_filter(merged, col)
-
-                            # Round for clarity
-                            for col in ["AvgAnnualCostCHF", "TotalValueCHF", "TotalVolumeM3", "TotalWeightKG",
-                                        "CHF_per_Value", "CHF_per_m3", "CHF_per_kg"]:
-                                merged[col] = merged[col].round(2)
-
-                            # Summary rows
-                            summary = pd.DataFrame({
-                                "BudgetCode": ["MEAN", "MEDIAN"],
-                                "AvgAnnualCostCHF": [merged["AvgAnnualCostCHF"].mean(), merged["AvgAnnualCostCHF"].median()],
-                                "TotalValueCHF": [merged["TotalValueCHF"].mean(), merged["TotalValueCHF"].median()],
-                                "TotalVolumeM3": [merged["TotalVolumeM3"].mean(), merged["TotalVolumeM3"].median()],
-                                "TotalWeightKG": [merged["TotalWeightKG"].mean(), merged["TotalWeightKG"].median()],
-                                "CHF_per_Value": [merged["CHF_per_Value"].mean(), merged["CHF_per_Value"].median()],
-                                "CHF_per_m3": [merged["CHF_per_m3"].mean(), merged["CHF_per_m3"].median()],
-                                "CHF_per_kg": [merged["CHF_per_kg"].mean(), merged["CHF_per_kg"].median()],
-                            }).round(2)
-
-                            full_output = pd.concat([summary, merged], ignore_index=True)
+                        if set_id is not None:
+                            full_output = store.load_table(set_id)
 
                             st.success("New cost coefficients calculated successfully.")
+                            st.caption(f"Saved as coefficient set #{set_id}; select it in the holding cost estimator.")
                             st.dataframe(full_output)
 
-                            # Save with timestamp
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            os.makedirs("data", exist_ok=True)
-                            filename = f"custom_cost_coefficients_{timestamp}.csv"
-                            filepath = os.path.join("data", filename)
-                            full_output.to_csv(filepath, index=False)
-
-                            st.download_button(
-                                label="Download new cost coefficients",
-                                data=full_output.to_csv(index=False),
-                                file_name=filename,
-                                mime="text/csv"
+                            unmatched = store.load_unmatched(set_id)
+                            if len(unmatched):
+                                with st.expander(f"{len(unmatched)} projects could not be matched and are not included"):
+                                    st.dataframe(unmatched, hide_index=True)
+
+                            download_button(
+                                "Download new cost coefficients",
+                                full_output,
+                                f"custom_cost_coefficients_{set_id}",
+                                key="custom_coefficients",
                             )
 
-                        except Exception as e:
-                            st.error(f"Error processing your data: {e}")
+                    except Exception as e:
+                        st.error(f"Error processing your data: {e}")
 with tab3:
             st.header("Estimate inventory holding costs")
 
+            store = get_coefficient_store()
             use_custom_rates = st.checkbox("Use custom cost coefficient file")
 
-            rate_df = None
+            rate_set_id = None
             if use_custom_rates:
                 rate_file = st.file_uploader("Upload cost coefficient file", type=["csv"], key="custom_rate_upload")
                 if rate_file:
-                    rate_df = pd.read_csv(rate_file)
+                    try:
+                        rate_set_id = store.import_csv(rate_file)
+                    except ValueError as e:
+                        st.error(f"Invalid cost coefficient file: {e}")
             else:
                 try:
-                    rate_df = pd.read_csv("data/default_cost_coefficients.csv")
+                    default_set_id = get_default_set_id(file_version(DEFAULT_COEFFICIENTS_PATH))
+                    coefficient_sets = store.list_sets()
+                    labels = {
+                        row.id: f"#{row.id} {row.label} ({row.created_at[:10]}, {row.n_projects} projects)"
+                        for row in coefficient_sets.itertuples()
+                    }
+                    rate_set_id = st.selectbox(
+                        "Cost coefficient set",
+                        list(labels),
+                        index=list(labels).index(default_set_id),
+                        format_func=labels.get,
+                    )
                 except FileNotFoundError:
                     st.error("Default cost coefficients not found. Please generate or upload one.")
             
-            inv_file = st.file_uploader("Upload inventory data", type=["xlsx"], key="inv_data_upload")
+            inv_files = st.file_uploader(
+                "Upload inventory data", type=["xlsx"], key="inv_data_upload", accept_multiple_files=True
+            )
 
             # Proceed only if we have both inventory data and cost coefficients
-            if inv_file and rate_df is not None:
+            if inv_files and rate_set_id is not None:
                 with st.spinner("Processing your data..."):
                     try:
-                        inventory_df = pd.read_excel(inv_file)
-
-                        inventory_df.columns = inventory_df.columns.str.strip()
-                        rate_df.columns = rate_df.columns.str.strip()
-
-                        inventory_df["actual_delivery_date"] = pd.to_datetime(inventory_df["actual_delivery_date"], errors="coerce")
-                        inventory_df["Year"] = inventory_df["actual_delivery_date"].dt.year
-                        inventory_df = inventory_df[inventory_df["Year"].isin([2023, 2024])]
-
-                        inventory_df["BudgetCode"] = inventory_df["project_id"].astype(str).str.strip()
-                        inventory_df["price_orderline"] = pd.to_numeric(inventory_df["price_orderline"], errors="coerce")
-                        inventory_df["order_volume_m3"] = pd.to_numeric(inventory_df["order_volume_m3"], errors="coerce")
-                        inventory_df["order_weight_kg"] = pd.to_numeric(inventory_df["order_weight_kg"], errors="coerce")
-
-                        inv_summary = (
-                            inventory_df.groupby("BudgetCode")
-                            .agg(
-                                TotalValueCHF=("price_orderline", "sum"),
-                                TotalVolumeM3=("order_volume_m3", "sum"),
-                                TotalWeightKG=("order_weight_kg", "sum")
+                        inventory_df, inventory_sources = load_inventory_files(inv_files)
+                        source_report(inventory_sources)
+
+                        keys = KeyIndex()
+                        inventory_totals = aggregate_inventory(inventory_df, keys=keys)
+                        if keys.malformed:
+                            st.warning(
+                                f"{len(keys.malformed)} project ids are not project codes and were left out: "
+                                + ", ".join(sorted(keys.malformed)[:10])
                             )
-                            .reset_index()
-                        )
 
                         # Use only the median row for cost rates
-                        median_row = rate_df[rate_df["BudgetCode"].str.contains("MEDIAN", case=False, na=False)]
-                        if median_row.empty:
+                        rates = store.summary(rate_set_id, "MEDIAN")
+                        if rates is None:
                             st.error("Median row not found in cost rate file.")
                         else:
-                            median_rates = median_row.iloc[0]
-
-                            # Apply cost multipliers
-                            inv_summary["Annual cost (value-based)"] = inv_summary["TotalValueCHF"] * median_rates["CHF_per_Value"]
-                            inv_summary["Annual cost (m^3-based)"] = inv_summary["TotalVolumeM3"] * median_rates["CHF_per_m3"]
-                            inv_summary["Annual cost (kg-based)"] = inv_summary["TotalWeightKG"] * median_rates["CHF_per_kg"]
-
-                            for col in [
-                                "TotalValueCHF", "TotalVolumeM3", "TotalWeightKG",
-                                "Annual cost (value-based)", "Annual cost (m^3-based)", "Annual cost (kg-based)"
-                            ]:
-                                inv_summary[col] = inv_summary[col].round(2)
-
-                            # Strip 'MCH' suffix from BudgetCode
-                            inv_summary["BudgetCode"] = inv_summary["BudgetCode"].str.replace("MCH$", "", regex=True)
+                            inv_summary = estimate_holding_costs(inventory_totals, rates)
 
                             st.success("Inventory holding cost estimates calculated.")
                             st.dataframe(inv_summary)
@@ -314,13 +421,77 @@ with tab3:
                                     st.subheader("Filtered Inventory Holding Costs")
                                     st.dataframe(filtered_df)
 
-                            st.download_button(
-                                label="Download estimated holding costs",
-                                data=inv_summary.to_csv(index=False),
-                                file_name="estimated_holding_costs.csv",
-                                mime="text/csv"
+                            download_button(
+                                "Download estimated holding costs",
+                                inv_summary,
+                                "estimated_holding_costs",
+                                key="holding_costs",
+                            )
+
+                            st.subheader("Compare cost rate scenarios")
+                            percentiles = st.multiselect(
+                                "Percentiles of the per-project rates",
+                                options=[5, 10, 25, 50, 75, 90, 95],
+                                default=DEFAULT_PERCENTILES,
+                            )
+                            include_projects = st.checkbox("Include every project's own rates as a scenario")
+                            scenario_df = get_scenarios(
+                                uploads_digest(inv_files),
+                                rate_set_id,
+                                tuple(sorted(percentiles)),
+                                include_projects,
+                                inventory_totals,
+                            )
+
+                            scenario_names = list(scenario_df["Scenario"].cat.categories)
+                            basis = st.selectbox("Basis", BASES)
+                            compared = st.multiselect(
+                                "Scenarios",
+                                options=scenario_names,
+                                default=[s for s in scenario_names if s in ("MEAN", "MEDIAN")] + [f"P{p:g}" for p in sorted(percentiles)],
+                            )
+                            if compared:
+                                st.dataframe(pivot_scenarios(scenario_df, basis, compared, selected_budgets))
+
+                            download_button(
+                                "Download all scenarios",
+                                scenario_df,
+                                "holding_cost_scenarios",
+                                key="holding_cost_scenarios",
                             )
 
+                            st.subheader("Monthly holding costs")
+                            window = st.slider(
+                                "Rolling window (months)", 1, 36, ROLLING_WINDOW_MONTHS,
+                                help="Each month shows the annual holding cost implied by the inventory "
+                                     "delivered in the window ending that month. A window as long as the "
+                                     "coefficient years matches the estimate above.",
+                            )
+                            monthly_df = rolling_holding_costs(
+                                get_monthly_inventory(uploads_digest(inv_files), inventory_df), rates, window
+                            )
+                            shown = monthly_df
+                            if selected_budgets:
+                                shown = monthly_df[monthly_df["BudgetCode"].isin(selected_budgets)]
+                            if shown.empty:
+                                # The window is longer than the months in the inventory
+                                st.info(f"The inventory does not cover a full {window}-month window. "
+                                        "Choose a shorter window.")
+                            else:
+                                if selected_budgets:
+                                    chart = shown.pivot_table(index="Month", columns="BudgetCode", values=basis,
+                                                              observed=True)
+                                else:
+                                    chart = shown.groupby("Month")[[basis]].sum()
+                                st.line_chart(chart.set_axis(chart.index.to_timestamp()))
+
+                                download_button(
+                                    "Download monthly holding costs",
+                                    shown,
+                                    f"monthly_holding_costs_{window}m",
+                                    key="monthly_holding_costs",
+                                )
+
                     except Exception as e:
                         st.error(f"Error estimating holding costs: {e}")
             else:
@@ -329,26 +500,18 @@ with tab3:
 with tab4:
     st.header("Developer manual")
     try:
-        with open("docs/dev_manual.md", "r", encoding="utf-8") as f:
-            md = f.read()
-
-        # Split by section title
-        split_section = "Project structure"
-        parts = md.split(split_section)
+        # Split by section title once per server; only rendering happens here
+        intro, tree_block, rest = get_dev_manual_sections(file_version("docs/dev_manual.md"))
 
         # Show the first part with markdown
-        st.markdown(parts[0] + f"## {split_section}", unsafe_allow_html=True)
-
-        if len(parts) > 1:
-            # Get only the tree block (between "Project structure" and "---")
-            tree_block = parts[1].split("---")[0].strip()
+        st.markdown(intro, unsafe_allow_html=True)
 
+        if tree_block is not None:
             st.code(tree_block, language="text")  # Preserves formatting
 
-            # Show the rest of the manual after '---'
-            if "---" in parts[1]:
-                rest = parts[1].split("---", 1)[1]
-                st.markdown("---\n" + rest, unsafe_allow_html=True)
+        # Show the rest of the manual after '---'
+        if rest is not None:
+            st.markdown(rest, unsafe_allow_html=True)
 
     except FileNotFoundError:
         st.error("Developer manual not found.")
@@ -356,12 +519,21 @@ with tab4:
 with tab5:
         st.header("User manual")
         try:
-            with open("docs/user_manual.md", "r", encoding="utf-8") as f:
-                md_content = f.read()
-                st.markdown(md_content, unsafe_allow_html=True)
+            md_content = get_manual("docs/user_manual.md", file_version("docs/user_manual.md"))
+            st.markdown(md_content, unsafe_allow_html=True)
         except FileNotFoundError:
             st.error("User manual not found in docs/user_manual.md")
 
-
-
-
+if show_diagnostics:
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        stage_records = records()
+        if stage_records:
+            diagnostics = pd.DataFrame(stage_records)
+            diagnostics["rss_delta_mib"] = (diagnostics["rss_delta_bytes"] / 2 ** 20).round(1)
+            st.dataframe(
+                diagnostics[["stage", "seconds", "rows_in", "rows_out", "rss_delta_mib", "status"]],
+                hide_index=True,
+            )
+            st.caption("Stages nest, e.g. excel_parse runs inside load_cost_excel.")
+        else:
+            st.caption("No stages ran in this rerun.")
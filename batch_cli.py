@@ -0,0 +1,197 @@
+# streamlit/batch_cli.py
+#
+# Headless batch runs over many ledgers, one ledger per worker process:
+#
+#   python batch_cli.py coefficients --cost "ledgers/*_cost.xlsx" --inventory "ledgers/*_inventory.xlsx" --out results
+#   python batch_cli.py coefficients --cost ledgers/ --inventory ledgers/ --rolling-window 12 --out results
+#   python batch_cli.py holding --inventory ledgers/ --rates data/default_cost_coefficients.csv --out results
+
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from coefficient_engine import aggregate_inventory
+from cost_coefficients import custom_cost_coefficients
+from cost_model import estimate_holding_costs, median_rates
+from config import ANNUALIZATION_DIVISOR, COEFFICIENT_YEARS, DEFAULT_COEFFICIENTS_PATH, IQR_FILTER_MODE
+from data_loader import load_cost_excel, load_inventory_excel
+from monthly_series import monthly_costs, monthly_inventory, rolling_coefficients
+from robust_stats import IQR_MODES
+
+
+def expand_inputs(patterns: list, tag: str) -> list:
+    # Directories contribute every workbook below them whose name contains the
+    # tag (e.g. 'cost'); anything else is used as a glob as given
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = glob.glob(os.path.join(pattern, "**", "*.xlsx"), recursive=True)
+            paths.update(p for p in found if tag.lower() in os.path.basename(p).lower())
+        else:
+            paths.update(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def ledger_key(path: str, tag: str) -> str:
+    # 'AO101_cost.xlsx' and 'AO101_inventory.xlsx' both map to 'ao101'; files
+    # named just 'cost.xlsx' / 'inventory.xlsx' are keyed by their directory
+    stem = re.sub(re.escape(tag), "", os.path.splitext(os.path.basename(path))[0], flags=re.IGNORECASE)
+    key = re.sub(r"[\s_.\-]+", "_", stem).strip("_").lower()
+    return key or os.path.basename(os.path.dirname(os.path.abspath(path))).lower()
+
+
+def key_paths(paths: list, tag: str) -> tuple:
+    # (ledger -> path, ledger -> paths for ledgers that several files map to).
+    # E.g. AO/2024_cost.xlsx and BF/2024_cost.xlsx are both '2024'; neither is
+    # run, instead of one silently replacing the other.
+    found = {}
+    for path in paths:
+        found.setdefault(ledger_key(path, tag), []).append(path)
+    unique = {key: group[0] for key, group in found.items() if len(group) == 1}
+    return unique, {key: group for key, group in found.items() if len(group) > 1}
+
+
+def pair_ledgers(cost_paths: list, inventory_paths: list, cost_tag: str, inventory_tag: str) -> tuple:
+    # (ledger -> (cost, inventory), unpaired ledgers, ledger -> colliding paths)
+    costs, cost_clashes = key_paths(cost_paths, cost_tag)
+    inventories, inventory_clashes = key_paths(inventory_paths, inventory_tag)
+    clashes = {
+        key: sorted(cost_clashes.get(key, []) + inventory_clashes.get(key, []))
+        for key in sorted(cost_clashes.keys() | inventory_clashes.keys())
+    }
+    costs = {key: path for key, path in costs.items() if key not in clashes}
+    inventories = {key: path for key, path in inventories.items() if key not in clashes}
+    pairs = {key: (costs[key], inventories[key]) for key in sorted(costs.keys() & inventories.keys())}
+    unmatched = sorted(costs.keys() ^ inventories.keys())
+    return pairs, unmatched, clashes
+
+
+def ambiguous_ledgers(clashes: dict) -> list:
+    # Timing rows for ledger names that several workbooks map to
+    rows = []
+    for ledger, paths in clashes.items():
+        error = "several workbooks map to this ledger: " + ", ".join(paths)
+        print(f"FAILED  {ledger}: {error}", file=sys.stderr)
+        rows.append({"Ledger": ledger, "Status": "ambiguous", "Seconds": None, "Rows": 0, "Error": error})
+    return rows
+
+
+def _run_coefficients(ledger: str, cost_path: str, inventory_path: str, mode: str, years: list,
+                      divisor: float, window: int) -> tuple:
+    start = time.perf_counter()
+    # Ledgers already run in parallel; a multi-sheet workbook must not start
+    # another pool of parsing processes inside each of them
+    cost_df = load_cost_excel(cost_path, actuals_only=True, workers=1)
+    inventory_df = load_inventory_excel(inventory_path, workers=1)
+    if window:
+        # One unfiltered coefficient row per project and window end month
+        table = rolling_coefficients(monthly_costs(cost_df), monthly_inventory(inventory_df), window, divisor)
+    else:
+        table = custom_cost_coefficients(cost_df, inventory_df, mode, years, divisor)
+    return table, time.perf_counter() - start
+
+
+def _run_holding(ledger: str, inventory_path: str, rates: pd.Series) -> tuple:
+    start = time.perf_counter()
+    inv_summary = aggregate_inventory(load_inventory_excel(inventory_path, workers=1))
+    table = estimate_holding_costs(inv_summary, rates)
+    return table, time.perf_counter() - start
+
+
+def run_jobs(jobs: dict, worker, workers: int) -> tuple:
+    # jobs: ledger -> positional args for worker. A failing ledger is recorded
+    # and the remaining ones keep running.
+    tables, timings = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(worker, ledger, *args): ledger for ledger, args in jobs.items()}
+        for future in as_completed(futures):
+            ledger = futures[future]
+            try:
+                table, seconds = future.result()
+            except Exception as e:
+                timings.append({"Ledger": ledger, "Status": "failed", "Seconds": None, "Rows": 0, "Error": str(e)})
+                print(f"FAILED  {ledger}: {e}", file=sys.stderr)
+                continue
+            table.insert(0, "Ledger", ledger)
+            tables.append(table)
+            timings.append({"Ledger": ledger, "Status": "ok", "Seconds": round(seconds, 3), "Rows": len(table), "Error": ""})
+            print(f"ok      {ledger}: {len(table)} rows in {seconds:.2f}s")
+    return tables, timings
+
+
+def _write_results(out_dir: str, name: str, tables: list, timings: list) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    if tables:
+        pd.concat(tables, ignore_index=True).sort_values("Ledger", kind="stable").to_csv(
+            os.path.join(out_dir, f"{name}.csv"), index=False
+        )
+    pd.DataFrame(timings, columns=["Ledger", "Status", "Seconds", "Rows", "Error"]).sort_values("Ledger").to_csv(
+        os.path.join(out_dir, f"{name}_timings.csv"), index=False
+    )
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch coefficient and holding-cost runs over many ledgers.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--out", default="results", help="Output directory")
+    steps = parser.add_subparsers(dest="step", required=True)
+
+    coefficients = steps.add_parser("coefficients", help="Cost coefficients per ledger (as in Tab 2)")
+    coefficients.add_argument("--cost", nargs="+", required=True, help="Cost workbooks: directories or globs")
+    coefficients.add_argument("--inventory", nargs="+", required=True, help="Inventory workbooks: directories or globs")
+    coefficients.add_argument("--cost-tag", default="cost", help="File name part that marks a cost workbook")
+    coefficients.add_argument("--inventory-tag", default="inventory", help="File name part that marks an inventory workbook")
+    coefficients.add_argument("--iqr-mode", choices=IQR_MODES, default=IQR_FILTER_MODE, help="Outlier filter mode")
+    coefficients.add_argument("--years", type=int, nargs="+", default=COEFFICIENT_YEARS, help="Years averaged into the coefficients")
+    coefficients.add_argument("--annualization-divisor", type=float, default=ANNUALIZATION_DIVISOR,
+                              help="Divides the cost over the years (default: number of years, or window/12)")
+    coefficients.add_argument("--rolling-window", type=int, default=None,
+                              help="Write trailing N-month coefficients for every month instead of one table")
+
+    holding = steps.add_parser("holding", help="Estimated holding costs per ledger (as in Tab 3)")
+    holding.add_argument("--inventory", nargs="+", required=True, help="Inventory workbooks: directories or globs")
+    holding.add_argument("--inventory-tag", default="inventory", help="File name part that marks an inventory workbook")
+    holding.add_argument("--rates", default=DEFAULT_COEFFICIENTS_PATH,
+                         help="Coefficient CSV whose MEDIAN row is applied")
+
+    args = parser.parse_args(argv)
+
+    if args.step == "coefficients":
+        pairs, failed, clashes = pair_ledgers(
+            expand_inputs(args.cost, args.cost_tag), expand_inputs(args.inventory, args.inventory_tag),
+            args.cost_tag, args.inventory_tag
+        )
+        for ledger in failed:
+            print(f"FAILED  {ledger}: no matching cost/inventory workbook", file=sys.stderr)
+        jobs = {
+            ledger: (cost_path, inventory_path, args.iqr_mode, args.years, args.annualization_divisor, args.rolling_window)
+            for ledger, (cost_path, inventory_path) in pairs.items()
+        }
+        tables, timings = run_jobs(jobs, _run_coefficients, args.workers)
+        timings += [{"Ledger": ledger, "Status": "unpaired", "Seconds": None, "Rows": 0, "Error": "no matching workbook"}
+                    for ledger in failed]
+        timings += ambiguous_ledgers(clashes)
+        name = "rolling_cost_coefficients" if args.rolling_window else "custom_cost_coefficients"
+        _write_results(args.out, name, tables, timings)
+    else:
+        rates = median_rates(pd.read_csv(args.rates).rename(columns=str.strip))
+        if rates is None:
+            parser.error(f"Median row not found in {args.rates}")
+        inventories, clashes = key_paths(expand_inputs(args.inventory, args.inventory_tag), args.inventory_tag)
+        jobs = {ledger: (path, rates) for ledger, path in sorted(inventories.items())}
+        tables, timings = run_jobs(jobs, _run_holding, args.workers)
+        timings += ambiguous_ledgers(clashes)
+        _write_results(args.out, "estimated_holding_costs", tables, timings)
+
+    failures = sum(t["Status"] != "ok" for t in timings)
+    print(f"{len(timings) - failures} ledgers succeeded, {failures} failed; results in {args.out}/")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# streamlit/benchmarks/load_test.py
+#
+# Requests per second and latency percentiles of api_server.py. Starts a
+# server on a free port (or uses --url) and runs keep-alive clients against it.
+# Run from the project root:
+#
+#   python -m benchmarks.load_test --concurrency 8 --seconds 10
+#   python -m benchmarks.load_test --mode post --batch-size 500 --url http://127.0.0.1:8502
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from api_server import _TOTALS
+from config import API_TOKEN_ENV, COST_BUDGET_COL
+
+# get:  GET /sets/default/coefficients for a few projects
+# post: POST /sets/default/holding-costs with --batch-size projects; every
+#       body is different, so each one is computed rather than served from
+#       the server's response cache
+# etag: the GET revalidated with If-None-Match, i.e. 304 responses
+MODES = ("get", "post", "etag")
+
+
+def request_for(mode: str, codes: list, batch_size: int, seed: int) -> tuple:
+    # (method, path, body) of the one request a client repeats
+    if mode == "post":
+        rng = np.random.default_rng(seed)
+        projects = [
+            {COST_BUDGET_COL: codes[i % len(codes)], **dict(zip(_TOTALS, rng.random(len(_TOTALS)) * 1000))}
+            for i in range(batch_size)
+        ]
+        body = json.dumps({"rates": "project", "projects": projects}).encode("utf-8")
+        return "POST", "/sets/default/holding-costs", body
+    return "GET", "/sets/default/coefficients?codes=" + ",".join(codes[:5]), None
+
+
+def client(url: str, mode: str, method: str, path: str, body: bytes, seconds: float) -> list:
+    # One keep-alive connection sending requests back to back; returns latencies
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    headers = {"Content-Type": "application/json"}
+    if os.environ.get(API_TOKEN_ENV):
+        headers["Authorization"] = "Bearer " + os.environ[API_TOKEN_ENV]
+    if mode == "etag":
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        headers["If-None-Match"] = response.getheader("ETag")
+
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sent = body
+        if mode == "post":
+            # The server ignores the extra key, but it changes the request's ETag
+            sent = body[:-1] + b',"request":%d}' % len(latencies)
+        start = time.perf_counter()
+        conn.request(method, path, sent, headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status not in (200, 304):
+            raise RuntimeError(f"{method} {path} returned {response.status}")
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies
+
+
+def start_server(db: str) -> tuple:
+    # (process, url) of a server on a free port
+    process = subprocess.Popen(
+        [sys.executable, "api_server.py", "--port", "0", "--db", db],
+        stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline().strip()
+    if not line.startswith("Serving on "):
+        process.kill()
+        raise RuntimeError("api_server.py did not start")
+    return process, line.removeprefix("Serving on ")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the coefficient HTTP API.")
+    parser.add_argument("--url", default=None, help="Running server (default: start one)")
+    parser.add_argument("--db", default=None, help="Coefficient store for the started server")
+    parser.add_argument("--mode", choices=MODES, default="get")
+    parser.add_argument("--concurrency", type=int, default=4, help="Client processes")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=100, help="Projects per POST")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if url is None:
+        db = args.db or os.path.join("benchmarks", "results", "load_test.sqlite")
+        os.makedirs(os.path.dirname(db), exist_ok=True)
+        process, url = start_server(db)
+    try:
+        parts = urlsplit(url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port)
+        headers = {"Authorization": "Bearer " + os.environ[API_TOKEN_ENV]} if os.environ.get(API_TOKEN_ENV) else {}
+        conn.request("GET", "/sets/default/coefficients", headers=headers)
+        codes = [p[COST_BUDGET_COL] for p in json.loads(conn.getresponse().read())["projects"]]
+        conn.close()
+
+        jobs = [
+            (url, args.mode, *request_for(args.mode, codes, args.batch_size, seed), args.seconds)
+            for seed in range(args.concurrency)
+        ]
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.concurrency) as pool:
+            latencies = np.concatenate(pool.starmap(client, jobs))
+        elapsed = time.perf_counter() - start
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(f"{args.mode}: {len(latencies)} requests from {args.concurrency} clients in {elapsed:.1f}s")
+    print(f"  {len(latencies) / elapsed:,.0f} requests/s, latency p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
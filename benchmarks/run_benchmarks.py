@@ -0,0 +1,242 @@
+# streamlit/benchmarks/run_benchmarks.py
+#
+# Per-stage wall time, peak RSS and Python allocations on synthetic ledgers.
+# Run from the project root:
+#
+#   python -m benchmarks.run_benchmarks --rows 10000 100000 1000000
+#   python -m benchmarks.run_benchmarks --rows 10000 --compare benchmarks/results/baseline.json
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import ingest_cache
+from benchmarks.synthetic import generate_cost_ledger, generate_inventory, write_workbook
+from config import COST_COLUMNS, EXCEL_MAX_ROWS
+from cost_coefficients import compute_cost_coefficients, custom_cost_coefficients
+from cost_model import filter_and_group_costs, summarize_annual_costs
+from data_loader import load_cost_excel, load_cost_files, load_inventory_excel
+from instrumentation import current_rss
+from monthly_series import monthly_costs, monthly_inventory, rolling_coefficients
+from schema import apply_cost_schema, apply_inventory_schema
+
+# Files the multi-file parse benchmark splits the cost ledger into
+MULTI_FILE_PARTS = 4
+
+
+def reset_peak_rss() -> None:
+    # Linux lets a process reset its RSS high-water mark (VmHWM)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _measure(fn, repeat: int) -> dict:
+    reset_peak_rss()
+    rss_before = current_rss()
+    times = []
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    peak = peak_rss()
+
+    # Separate run under tracemalloc so its overhead does not skew the timings
+    tracemalloc.start()
+    fn()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_s_min": min(times),
+        "wall_s_median": statistics.median(times),
+        "runs": repeat,
+        "peak_rss_bytes": peak,
+        "peak_rss_delta_bytes": max(peak - rss_before, 0),
+        "alloc_peak_bytes": alloc_peak,
+        "rows_out": len(out) if out is not None else None,
+    }
+
+
+def _run_isolated(fn, repeat: int) -> dict:
+    # Each stage runs in a forked child so its RSS peak is not masked by earlier stages
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return _measure(fn, repeat)
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+
+    def child():
+        try:
+            queue.put(_measure(fn, repeat))
+        except Exception as e:
+            queue.put({"error": repr(e)})
+
+    process = ctx.Process(target=child)
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def build_stages(rows: int, n_budget_codes: int, years: list, seed: int, workdir: str) -> list:
+    raw_cost_df = generate_cost_ledger(rows, n_budget_codes, years, seed=seed)
+    raw_inventory_df = generate_inventory(rows, n_budget_codes, years, seed=seed + 1)
+    # The app works on typed frames (schema.py), as returned by the loaders
+    cost_df = apply_cost_schema(raw_cost_df)
+    inventory_df = apply_inventory_schema(raw_inventory_df)
+    projected = cost_df[COST_COLUMNS]
+    grouped = filter_and_group_costs(projected)
+
+    stages = []
+    if rows <= EXCEL_MAX_ROWS:
+        cost_path = os.path.join(workdir, f"cost_{rows}.xlsx")
+        inventory_path = os.path.join(workdir, f"inventory_{rows}.xlsx")
+        write_workbook(raw_cost_df, cost_path)
+        write_workbook(raw_inventory_df, inventory_path)
+        # The same ledger split over several files, parsed in parallel worker processes
+        cost_part_paths = []
+        for i, part in enumerate(np.array_split(np.arange(rows), MULTI_FILE_PARTS)):
+            cost_part_paths.append(os.path.join(workdir, f"cost_{rows}_part{i}.xlsx"))
+            write_workbook(raw_cost_df.iloc[part], cost_part_paths[-1])
+
+        def cold(load, path):
+            ingest_cache.invalidate()
+            return load(path)
+
+        stages += [
+            ("excel_parse_cost", rows, lambda: cold(load_cost_excel, cost_path)),
+            ("excel_parse_cost_cached", rows, lambda: load_cost_excel(cost_path)),
+            (f"excel_parse_cost_{MULTI_FILE_PARTS}_files", rows, lambda: cold(load_cost_files, cost_part_paths)),
+            ("excel_parse_inventory", rows, lambda: cold(load_inventory_excel, inventory_path)),
+        ]
+    stages += [
+        ("apply_cost_schema", rows, lambda: apply_cost_schema(raw_cost_df[COST_COLUMNS])),
+        ("filter_and_group_costs", rows, lambda: filter_and_group_costs(projected)),
+        ("summarize_annual_costs", len(grouped), lambda: summarize_annual_costs(grouped)),
+        ("compute_cost_coefficients", rows, lambda: compute_cost_coefficients(cost_df, inventory_df)),
+        ("custom_cost_coefficients", rows, lambda: custom_cost_coefficients(cost_df, inventory_df)),
+        ("monthly_inventory", rows, lambda: monthly_inventory(inventory_df)),
+        ("rolling_coefficients", rows, lambda: rolling_coefficients(monthly_costs(cost_df), monthly_inventory(inventory_df))),
+    ]
+    return stages
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep benchmark parses out of the real upload cache
+        ingest_cache.INGEST_CACHE_DIR = os.path.join(workdir, "ingest")
+        for rows in args.rows:
+            stages = build_stages(rows, args.budget_codes, args.years, args.seed, workdir)
+            skipped = rows > EXCEL_MAX_ROWS
+            for name, rows_in, fn in stages:
+                if name == "excel_parse_cost_cached":
+                    fn()  # warm the cache once before timing cached reads
+                measured = _run_isolated(fn, args.repeat)
+                results.append({"stage": name, "rows": rows, "rows_in": rows_in, **measured})
+                print(f"{rows:>9} {name:<28} " + (
+                    measured["error"] if "error" in measured else
+                    f"{measured['wall_s_median']:8.3f}s  rss+{measured['peak_rss_delta_bytes'] / 2**20:8.1f} MiB  "
+                    f"alloc {measured['alloc_peak_bytes'] / 2**20:8.1f} MiB"
+                ))
+            if skipped:
+                print(f"{rows:>9} excel stages skipped: more rows than one Excel sheet holds")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "budget_codes": args.budget_codes,
+            "years": args.years,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    # Median wall time per (stage, rows) against a previous run
+    old = {(r["stage"], r["rows"]): r for r in baseline["results"] if "error" not in r}
+    regressions = 0
+    print(f"\n{'stage':<28} {'rows':>9} {'before':>9} {'after':>9} {'ratio':>7}")
+    for r in current["results"]:
+        before = old.get((r["stage"], r["rows"]))
+        if before is None or "error" in r:
+            continue
+        ratio = r["wall_s_median"] / before["wall_s_median"] if before["wall_s_median"] else float("inf")
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        regressions += bool(flag)
+        print(f"{r['stage']:<28} {r['rows']:>9} {before['wall_s_median']:9.3f} {r['wall_s_median']:9.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic ledgers.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--budget-codes", type=int, default=150)
+    parser.add_argument("--years", type=int, nargs="+", default=[2022, 2023, 2024])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None, help="JSON output path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier JSON result to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    out = args.out or os.path.join("benchmarks", "results", datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return 1 if compare(report, json.load(f), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
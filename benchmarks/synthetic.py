@@ -0,0 +1,70 @@
+# streamlit/benchmarks/synthetic.py
+#
+# Seeded synthetic cost and inventory ledgers shaped like the MSF exports.
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from config import EXCEL_MAX_ROWS, INCLUDED_COST_CATEGORIES
+
+DEFAULT_CATEGORY_MIX = {category: 1.0 for category in INCLUDED_COST_CATEGORIES + ["FREIGHT"]}
+
+
+def budget_codes(n: int) -> np.ndarray:
+    # Distinct codes in the ^[A-Z]{2}\d{3}$ format, e.g. 'AA100', 'AB100', ...
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return np.array([
+        f"{letters[i // 26 % 26]}{letters[i % 26]}{100 + i // 676:03d}"
+        for i in range(n)
+    ])
+
+
+def generate_cost_ledger(rows: int, n_budget_codes: int = 100, years: list = (2022, 2023, 2024),
+                         category_mix: dict = None, actuals_share: float = 0.8,
+                         seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    category_mix = category_mix or DEFAULT_CATEGORY_MIX
+    categories = np.array(list(category_mix))
+    weights = np.array(list(category_mix.values()), dtype=float)
+    months = np.array([f"{year}-{month:02d}" for year in years for month in range(1, 13)])
+
+    codes = budget_codes(n_budget_codes)
+    return pd.DataFrame({
+        "BudgetCode": codes[rng.integers(0, len(codes), rows)],
+        "whatLVL1Desc": categories[rng.choice(len(categories), rows, p=weights / weights.sum())],
+        "Total CHF": rng.gamma(2.0, 750.0, rows).round(2),
+        "DecisionMoment": months[rng.integers(0, len(months), rows)],
+        "Actuals/forecast": np.where(rng.random(rows) < actuals_share, "Actuals", "Forecast"),
+        # Unused columns, as in the full ERP export
+        "whatLVL2Desc": "GENERAL",
+        "Comment": rng.integers(0, 10_000, rows).astype(str),
+    })
+
+
+def generate_inventory(rows: int, n_budget_codes: int = 100, years: list = (2022, 2023, 2024),
+                       project_suffix: str = "MCH", seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    codes = budget_codes(n_budget_codes)
+    start = np.datetime64(f"{min(years)}-01-01")
+    days = (np.datetime64(f"{max(years) + 1}-01-01") - start).astype(int)
+    price = rng.gamma(2.0, 150.0, rows).round(2)
+    return pd.DataFrame({
+        "project_id": np.char.add(codes[rng.integers(0, len(codes), rows)], project_suffix),
+        "actual_delivery_date": start + rng.integers(0, days, rows).astype("timedelta64[D]"),
+        "price_orderline": price,
+        "invoiced_amount": (price * rng.uniform(0.9, 1.1, rows)).round(2),
+        "order_volume_m3": rng.gamma(1.0, 0.05, rows).round(4),
+        "order_weight_kg": rng.gamma(1.0, 15.0, rows).round(2),
+    })
+
+
+def write_workbook(df: pd.DataFrame, path: str) -> None:
+    # Write-only mode keeps memory flat even for sheets near the row limit
+    if len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df)} rows do not fit into one Excel sheet")
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append([v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in row])
+    wb.save(path)
@@ -0,0 +1,88 @@
+# streamlit/budget_keys.py
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from config import COST_BUDGET_COL
+
+# A project code, e.g. 'AO101'. Inventory project ids add a three-letter
+# mission suffix ('AO101MCH'); both forms map to the same canonical code.
+_PROJECT_ID_PATTERN = re.compile(r"^([A-Z]{2}\d{3})(?:[A-Z]{3})?$")
+
+
+@lru_cache(maxsize=65536)
+def canonical_code(value) -> str:
+    # 'AO101', ' ao101 ' and 'AO101MCH' -> 'AO101'; None for anything that is
+    # not a project code. Cached, so each distinct raw value is parsed once
+    # per process.
+    match = _PROJECT_ID_PATTERN.match(str(value).strip().upper())
+    return match.group(1) if match else None
+
+
+def canonical_mask(values: pd.Series) -> np.ndarray:
+    # Rows holding a canonical project code; missing, malformed (e.g. 'Total')
+    # and not yet normalised values are False. One check per distinct value.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    ok = np.fromiter((canonical_code(u) == u for u in uniques), dtype=bool, count=len(uniques))
+    return np.where(codes >= 0, ok[codes], False) if len(ok) else np.zeros(len(codes), dtype=bool)
+
+
+class KeyIndex:
+    # Canonical BudgetCode <-> integer key. Both sides of a join are encoded
+    # with one index, so the same project gets the same integer and joins and
+    # groupbys run on integers instead of strings.
+
+    def __init__(self):
+        self._keys = {}
+        self._labels = []
+        # Raw values that are not project codes, e.g. 'Total' or typos
+        self.malformed = set()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    @property
+    def labels(self) -> pd.Index:
+        # Canonical code per integer key
+        return pd.Index(self._labels, dtype=str)
+
+    def _key(self, raw) -> int:
+        code = canonical_code(raw)
+        if code is None:
+            self.malformed.add(str(raw).strip())
+            return -1
+        key = self._keys.get(code)
+        if key is None:
+            key = self._keys[code] = len(self._labels)
+            self._labels.append(code)
+        return key
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        # Integer key per row, -1 for missing or malformed values. Only the
+        # distinct raw values are looked at (the categories of a typed column).
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        keys = np.fromiter((self._key(u) for u in uniques), dtype=np.intp, count=len(uniques))
+        return np.where(codes >= 0, keys[codes], -1) if len(keys) else np.full(len(codes), -1, dtype=np.intp)
+
+
+def unmatched_keys(index: KeyIndex, left: np.ndarray, right: np.ndarray,
+                   names: tuple = ("cost", "inventory")) -> pd.DataFrame:
+    # Projects that an inner join on the two boolean 'seen' masks (one entry
+    # per integer key) would drop, plus the malformed raw values
+    only_left = np.flatnonzero(left & ~right)
+    only_right = np.flatnonzero(right & ~left)
+    labels = index.labels
+    malformed = sorted(index.malformed)
+    return pd.DataFrame({
+        COST_BUDGET_COL: list(labels[only_left]) + list(labels[only_right]) + malformed,
+        "Issue": [f"no {names[1]} rows"] * len(only_left) + [f"no {names[0]} rows"] * len(only_right)
+                 + ["not a project code"] * len(malformed),
+    })
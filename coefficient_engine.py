@@ -0,0 +1,206 @@
+# streamlit/coefficient_engine.py
+
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from config import (
+    ANNUALIZATION_DIVISOR, COEFFICIENT_YEARS, COST_BUDGET_COL, COST_CATEGORY_COL, COST_DATE_COL, COST_FILTER_COL,
+    COST_VALUE_COL, INVENTORY_DATE_COL, INVENTORY_KEY_COL, IQR_FILTER_MODE,
+    BOOTSTRAP_RESAMPLES,
+)
+from budget_keys import KeyIndex, unmatched_keys
+from instrumentation import stage, timed
+from robust_stats import ci_rows, iqr_mask
+from schema import actuals_mask
+
+# Part of every stored coefficient set's identity; bump when results change
+ENGINE_VERSION = "3"
+
+# Output columns shared by every caller (tab 2, tab 3, cost_coefficients.py)
+INVENTORY_TOTALS = ["TotalValueCHF", "TotalVolumeM3", "TotalWeightKG"]
+COEFFICIENT_COLS = ["CHF_per_Value", "CHF_per_m3", "CHF_per_kg"]
+ROUNDED_COLS = ["AvgAnnualCostCHF"] + INVENTORY_TOTALS + COEFFICIENT_COLS
+
+
+def per_distinct(values: pd.Series, fn: Callable) -> tuple:
+    # Apply fn once per distinct value; returns (codes, results) where
+    # results[codes] broadcasts back to rows and code -1 marks missing values
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Typed frames (schema.py) already carry the codes
+        return values.cat.codes.to_numpy(), fn(values.cat.categories)
+    codes, uniques = pd.factorize(values)
+    return codes, fn(pd.Index(uniques))
+
+
+def _years(values: pd.Series) -> np.ndarray:
+    # Calendar year per row, -1 where the date cannot be read
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.year.fillna(-1).to_numpy(dtype=np.int64)
+
+    def parse(uniques: pd.Index) -> np.ndarray:
+        if hasattr(uniques, "year"):
+            # Months or dates, e.g. the categories of a typed DecisionMoment
+            return np.nan_to_num(np.asarray(uniques.year, dtype=np.float64), nan=-1).astype(np.int64)
+        parsed = pd.to_datetime(uniques, errors="coerce", format="mixed")
+        years = np.asarray(parsed.year, dtype=np.float64)
+        # Fall back to a leading 'YYYY' for values such as '2023-Q1'
+        prefix = pd.to_numeric(uniques.astype(str).str.slice(0, 4), errors="coerce")
+        years = np.where(np.isnan(years), np.asarray(prefix, dtype=np.float64), years)
+        return np.nan_to_num(years, nan=-1).astype(np.int64)
+
+    codes, years = per_distinct(values, parse)
+    return np.where(codes >= 0, years[codes], -1)
+
+
+def _grouped_sums(codes: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    # Column-wise grouped sums with NaN treated as 0 (pandas' skipna behaviour)
+    values = np.nan_to_num(values, nan=0.0)
+    return np.column_stack([
+        np.bincount(codes, weights=values[:, j], minlength=n_groups)
+        for j in range(values.shape[1])
+    ])
+
+
+def numeric_matrix(df: pd.DataFrame, columns: list) -> np.ndarray:
+    # Float matrix (rows x columns); unreadable values become NaN
+    return np.column_stack([
+        pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+        for col in columns
+    ])
+
+
+def _cost_rows(cost_df: pd.DataFrame, years: list, categories: list) -> pd.DataFrame:
+    # Actuals in the given years (and categories)
+    cost_df = cost_df.rename(columns=str.strip)
+    mask = np.isin(_years(cost_df[COST_DATE_COL]), years)
+    if COST_FILTER_COL in cost_df.columns:
+        mask &= actuals_mask(cost_df[COST_FILTER_COL])
+    if categories is not None:
+        mask &= cost_df[COST_CATEGORY_COL].isin(categories).to_numpy()
+    return cost_df[mask]
+
+
+def _inventory_rows(inventory_df: pd.DataFrame, years: list) -> pd.DataFrame:
+    inventory_df = inventory_df.rename(columns=str.strip)
+    return inventory_df[np.isin(_years(inventory_df[INVENTORY_DATE_COL]), years)]
+
+
+def _inventory_values(rows: pd.DataFrame, value_col: str) -> np.ndarray:
+    return numeric_matrix(rows, [value_col, "order_volume_m3", "order_weight_kg"])
+
+
+def _key_sums(codes: np.ndarray, n_keys: int, values: np.ndarray) -> tuple:
+    # (sums per integer key, whether the key had any rows)
+    valid = codes >= 0
+    totals = _grouped_sums(codes[valid], n_keys, values[valid])
+    return totals, np.bincount(codes[valid], minlength=n_keys) > 0
+
+
+def _by_label(keys: KeyIndex, seen: np.ndarray) -> tuple:
+    # Positions of the seen keys in BudgetCode order, and those codes
+    positions = np.flatnonzero(seen)
+    labels = keys.labels[positions]
+    order = np.argsort(labels)
+    return positions[order], labels[order]
+
+
+@timed()
+def aggregate_costs(cost_df: pd.DataFrame, years: list = COEFFICIENT_YEARS, categories: list = None,
+                    keys: KeyIndex = None, divisor: float = ANNUALIZATION_DIVISOR) -> pd.DataFrame:
+    # Average annual cost per BudgetCode over the given years (actuals only);
+    # the total is divided by divisor, or by the number of years if None
+    keys = KeyIndex() if keys is None else keys
+    rows = _cost_rows(cost_df, years, categories)
+    codes = keys.encode(rows[COST_BUDGET_COL])
+    totals, seen = _key_sums(codes, len(keys), numeric_matrix(rows, [COST_VALUE_COL]))
+    positions, labels = _by_label(keys, seen)
+    return pd.DataFrame({
+        COST_BUDGET_COL: labels,
+        "AvgAnnualCostCHF": totals[positions, 0] / (divisor or len(years)),
+    })
+
+
+@timed()
+def aggregate_inventory(inventory_df: pd.DataFrame, years: list = COEFFICIENT_YEARS,
+                        value_col: str = "price_orderline", keys: KeyIndex = None) -> pd.DataFrame:
+    # Total value, volume and weight per BudgetCode over the given years
+    keys = KeyIndex() if keys is None else keys
+    rows = _inventory_rows(inventory_df, years)
+    codes = keys.encode(rows[INVENTORY_KEY_COL])
+    totals, seen = _key_sums(codes, len(keys), _inventory_values(rows, value_col))
+    positions, labels = _by_label(keys, seen)
+    out = pd.DataFrame(totals[positions], columns=INVENTORY_TOTALS)
+    out.insert(0, COST_BUDGET_COL, labels)
+    return out
+
+
+def safe_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # A zero or missing denominator gives NaN rather than inf
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=(denominator != 0) & ~np.isnan(denominator))
+    return out
+
+
+@timed()
+def coefficient_inputs(cost_df: pd.DataFrame, inventory_df: pd.DataFrame, years: list = COEFFICIENT_YEARS,
+                       categories: list = None, value_col: str = "price_orderline",
+                       divisor: float = ANNUALIZATION_DIVISOR) -> tuple:
+    # Per-project cost coefficients: average annual cost divided by each
+    # inventory total. Both sides are keyed by one KeyIndex, so the join is a
+    # mask over integer keys. Returns (coefficients, unmatched projects).
+    keys = KeyIndex()
+    cost_rows = _cost_rows(cost_df, years, categories)
+    inventory_rows = _inventory_rows(inventory_df, years)
+    cost_codes = keys.encode(cost_rows[COST_BUDGET_COL])
+    inventory_codes = keys.encode(inventory_rows[INVENTORY_KEY_COL])
+
+    cost_totals, cost_seen = _key_sums(cost_codes, len(keys), numeric_matrix(cost_rows, [COST_VALUE_COL]))
+    inventory_totals, inventory_seen = _key_sums(inventory_codes, len(keys), _inventory_values(inventory_rows, value_col))
+
+    with stage("join_keys", len(keys)) as record:
+        positions, labels = _by_label(keys, cost_seen & inventory_seen)
+        annual = cost_totals[positions, 0] / (divisor or len(years))
+        merged = pd.DataFrame(inventory_totals[positions], columns=INVENTORY_TOTALS)
+        merged.insert(0, "AvgAnnualCostCHF", annual)
+        merged.insert(0, COST_BUDGET_COL, labels)
+        for total, coefficient in zip(INVENTORY_TOTALS, COEFFICIENT_COLS):
+            merged[coefficient] = safe_ratio(annual, merged[total].to_numpy(dtype=np.float64))
+        unmatched = unmatched_keys(keys, cost_seen, inventory_seen)
+        record["rows_out"] = len(merged)
+        record["unmatched"] = len(unmatched)
+    return merged, unmatched
+
+
+def compute_coefficients(cost_df: pd.DataFrame, inventory_df: pd.DataFrame, years: list = COEFFICIENT_YEARS,
+                         categories: list = None, value_col: str = "price_orderline",
+                         divisor: float = ANNUALIZATION_DIVISOR) -> pd.DataFrame:
+    return coefficient_inputs(cost_df, inventory_df, years, categories, value_col, divisor)[0]
+
+
+def iqr_filter(df: pd.DataFrame, columns: list = COEFFICIENT_COLS, mode: str = IQR_FILTER_MODE) -> pd.DataFrame:
+    # Drop rows outside the IQR fences of the given columns (see robust_stats.iqr_mask)
+    return df[iqr_mask(df[columns].to_numpy(dtype=np.float64), mode)]
+
+
+@timed()
+def coefficient_table(merged: pd.DataFrame, mode: str = IQR_FILTER_MODE,
+                      n_resamples: int = BOOTSTRAP_RESAMPLES) -> pd.DataFrame:
+    # Publishable table: outliers removed, values rounded, MEAN/MEDIAN rows and
+    # their bootstrap confidence intervals on top
+    merged = merged.dropna()
+    with stage("iqr_filter", len(merged)) as record:
+        merged = iqr_filter(merged, COEFFICIENT_COLS, mode)
+        record["rows_out"] = len(merged)
+
+    merged = merged.copy()
+    merged[ROUNDED_COLS] = merged[ROUNDED_COLS].round(2)
+
+    summary = pd.DataFrame({
+        COST_BUDGET_COL: ["MEAN", "MEDIAN"],
+        **{col: [merged[col].mean(), merged[col].median()] for col in ROUNDED_COLS},
+    })
+    with stage("bootstrap_ci", len(merged)):
+        intervals = ci_rows(merged, ROUNDED_COLS, COST_BUDGET_COL, n_resamples=n_resamples)
+    summary = pd.concat([summary, intervals], ignore_index=True).round(2)
+    return pd.concat([summary, merged], ignore_index=True)
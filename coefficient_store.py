@@ -0,0 +1,204 @@
+# streamlit/coefficient_store.py
+
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+from coefficient_engine import ROUNDED_COLS
+from config import COEFFICIENT_DB_PATH
+from ingest_cache import read_upload_bytes
+
+# Summary rows are stored by statistic name; everything else is a project row
+SUMMARY_STATS = ("MEAN", "MEDIAN", "MEAN_CI_LOW", "MEAN_CI_HIGH", "MEDIAN_CI_LOW", "MEDIAN_CI_HIGH")
+
+_METRIC_DDL = ", ".join(f'"{col}" REAL' for col in ROUNDED_COLS)
+_METRICS = ", ".join(f'"{col}"' for col in ROUNDED_COLS)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS coefficient_sets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    input_hash TEXT NOT NULL UNIQUE,
+    label TEXT,
+    created_at TEXT NOT NULL,
+    n_projects INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS coefficient_rows (
+    set_id INTEGER NOT NULL REFERENCES coefficient_sets(id) ON DELETE CASCADE,
+    BudgetCode TEXT NOT NULL,
+    {_METRIC_DDL},
+    PRIMARY KEY (set_id, BudgetCode)
+);
+CREATE INDEX IF NOT EXISTS idx_coefficient_rows_budget ON coefficient_rows(BudgetCode);
+CREATE TABLE IF NOT EXISTS coefficient_summaries (
+    set_id INTEGER NOT NULL REFERENCES coefficient_sets(id) ON DELETE CASCADE,
+    stat TEXT NOT NULL,
+    {_METRIC_DDL},
+    PRIMARY KEY (set_id, stat)
+);
+CREATE TABLE IF NOT EXISTS coefficient_unmatched (
+    set_id INTEGER NOT NULL REFERENCES coefficient_sets(id) ON DELETE CASCADE,
+    BudgetCode TEXT NOT NULL,
+    Issue TEXT NOT NULL
+);
+"""
+
+
+def input_hash(*parts) -> str:
+    # Identity of a coefficient set: hashes of its inputs plus how it was computed
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def _stat_name(code) -> str:
+    # 'MEDIAN', 'Median (filtered)' -> 'MEDIAN', 'MEAN_CI_LOW' -> 'MEAN_CI_LOW';
+    # project codes -> None
+    words = str(code).strip().upper().split()
+    return words[0] if words and words[0] in SUMMARY_STATS else None
+
+
+def _records(df: pd.DataFrame, columns: list) -> list:
+    # NaN -> NULL
+    return list(df[columns].astype(object).where(df[columns].notna(), None).itertuples(index=False, name=None))
+
+
+class CoefficientStore:
+
+    def __init__(self, path: str = COEFFICIENT_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call keeps the store safe to share
+        # between Streamlit sessions (threads)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def find(self, input_hash: str) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id FROM coefficient_sets WHERE input_hash = ?", (input_hash,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, table: pd.DataFrame, input_hash: str, label: str = None, unmatched: pd.DataFrame = None) -> int:
+        # Store a coefficient table (MEAN/MEDIAN rows plus one row per project)
+        # and the projects left out of it (budget_keys.unmatched_keys).
+        # Identical inputs are stored once; the existing id is returned.
+        existing = self.find(input_hash)
+        if existing is not None:
+            return existing
+
+        table = table.rename(columns=str.strip)
+        stats = table["BudgetCode"].map(_stat_name)
+        summaries = table[stats.notna()].assign(stat=stats[stats.notna()]).drop_duplicates("stat")
+        projects = table[stats.isna()].drop_duplicates("BudgetCode")
+        projects = projects.assign(BudgetCode=projects["BudgetCode"].astype(str).str.strip())
+
+        placeholders = ", ".join("?" * (len(ROUNDED_COLS) + 2))
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO coefficient_sets (input_hash, label, created_at, n_projects) VALUES (?, ?, ?, ?)",
+                (input_hash, label, datetime.now().isoformat(timespec="seconds"), len(projects)),
+            )
+            if cursor.rowcount == 0:
+                # Another session stored the same inputs in the meantime
+                return conn.execute("SELECT id FROM coefficient_sets WHERE input_hash = ?", (input_hash,)).fetchone()[0]
+            set_id = cursor.lastrowid
+            conn.executemany(
+                f"INSERT INTO coefficient_rows (set_id, BudgetCode, {_METRICS}) VALUES ({placeholders})",
+                [(set_id,) + r for r in _records(projects, ["BudgetCode"] + ROUNDED_COLS)],
+            )
+            conn.executemany(
+                f"INSERT INTO coefficient_summaries (set_id, stat, {_METRICS}) VALUES ({placeholders})",
+                [(set_id,) + r for r in _records(summaries, ["stat"] + ROUNDED_COLS)],
+            )
+            if unmatched is not None:
+                conn.executemany(
+                    "INSERT INTO coefficient_unmatched (set_id, BudgetCode, Issue) VALUES (?, ?, ?)",
+                    [(set_id,) + r for r in _records(unmatched, ["BudgetCode", "Issue"])],
+                )
+        return set_id
+
+    def import_csv(self, file, label: str = None) -> int:
+        # Import a coefficient CSV (upload, path or file-like); keyed by its bytes
+        data = read_upload_bytes(file)
+        key = input_hash("csv", hashlib.sha256(data).hexdigest())
+        existing = self.find(key)
+        if existing is not None:
+            return existing
+
+        table = pd.read_csv(io.BytesIO(data))
+        table.columns = table.columns.str.strip()
+        missing = [col for col in ["BudgetCode"] + ROUNDED_COLS if col not in table.columns]
+        if missing:
+            raise ValueError(f"Coefficient file is missing columns: {', '.join(missing)}")
+        if table[ROUNDED_COLS].isna().all().all():
+            raise ValueError("Coefficient file contains no values")
+        return self.save(table, key, label or getattr(file, "name", None) or str(file))
+
+    def list_sets(self) -> pd.DataFrame:
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT id, label, created_at, n_projects FROM coefficient_sets ORDER BY id DESC", conn
+            )
+
+    def summary(self, set_id: int, stat: str = "MEDIAN") -> pd.Series:
+        # One summary row as a Series of metrics, or None if the set has none
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(
+                "SELECT * FROM coefficient_summaries WHERE set_id = ? AND stat = ?", conn, params=(set_id, stat)
+            )
+        if df.empty or df[ROUNDED_COLS].isna().all(axis=None):
+            return None
+        return df.iloc[0][ROUNDED_COLS].astype(float)
+
+    def load_rows(self, set_id: int) -> pd.DataFrame:
+        # Per-project coefficients of one set
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                f"SELECT BudgetCode, {_METRICS} FROM coefficient_rows WHERE set_id = ? ORDER BY BudgetCode",
+                conn, params=(set_id,),
+            )
+
+    def load_unmatched(self, set_id: int) -> pd.DataFrame:
+        # Projects that had cost but no inventory rows (or the reverse) when the set was computed
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT BudgetCode, Issue FROM coefficient_unmatched WHERE set_id = ? ORDER BY Issue, BudgetCode",
+                conn, params=(set_id,),
+            )
+
+    def load_table(self, set_id: int) -> pd.DataFrame:
+        # The set in the published layout: MEAN/MEDIAN rows first, then projects
+        with closing(self._connect()) as conn:
+            summaries = pd.read_sql_query(
+                "SELECT * FROM coefficient_summaries WHERE set_id = ?", conn, params=(set_id,)
+            )
+        order = {stat: i for i, stat in enumerate(SUMMARY_STATS)}
+        summaries = (
+            summaries.sort_values("stat", key=lambda s: s.map(order).fillna(len(order)))
+            .rename(columns={"stat": "BudgetCode"})[["BudgetCode"] + ROUNDED_COLS]
+        )
+        return pd.concat([summaries, self.load_rows(set_id)], ignore_index=True)
+
+    def delete(self, set_id: int) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM coefficient_sets WHERE id = ?", (set_id,))
+
+
+if __name__ == "__main__":
+    # Import existing coefficient CSVs, e.g.
+    #   python coefficient_store.py data/custom_cost_coefficients_*.csv
+    store = CoefficientStore()
+    for path in sys.argv[1:]:
+        try:
+            print(f"{path}: coefficient set #{store.import_csv(path)}")
+        except ValueError as e:
+            print(f"{path}: skipped ({e})")
@@ -17,3 +17,77 @@ COST_VALUE_COL = "Total CHF"
 COST_CATEGORY_COL = "whatLVL1Desc"
 COST_FILTER_COL = "Actuals/forecast"
 COST_FILTER_VALUE = "actuals"
+
+# Columns used from the inventory file
+INVENTORY_DATE_COL = "actual_delivery_date"
+INVENTORY_KEY_COL = "project_id"
+
+# Years averaged into the cost coefficients. Costs over these years are
+# divided by ANNUALIZATION_DIVISOR to get an annual cost; None divides by
+# the number of years.
+COEFFICIENT_YEARS = [2023, 2024]
+ANNUALIZATION_DIVISOR = None
+
+# Trailing window (months) for the monthly series (see monthly_series.py)
+ROLLING_WINDOW_MONTHS = 12
+
+# On-disk caches (see ingest_cache.py and aggregate_store.py)
+CACHE_DIR = ".cache"
+INGEST_CACHE_DIR = f"{CACHE_DIR}/ingest"
+# The suffix changes whenever the stored key types do (v2: Period[M] months)
+AGGREGATE_STORE_DIR = f"{CACHE_DIR}/aggregates-v3"
+INGEST_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Bump when the parsing logic changes so stale cache entries are not reused
+INGEST_CACHE_VERSION = "6"
+
+# Published coefficients shown in Tab 2 and used by default in Tab 3
+DEFAULT_COEFFICIENTS_PATH = "data/default_cost_coefficients.csv"
+
+# Versioned coefficient sets written by Tab 2 (see coefficient_store.py)
+COEFFICIENT_DB_PATH = "data/coefficient_store.sqlite"
+
+# Outlier filter and bootstrap intervals for the coefficient summary rows (see robust_stats.py)
+IQR_FILTER_MODE = "sequential"
+BOOTSTRAP_RESAMPLES = 10_000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 0
+
+# Columns kept when streaming a cost workbook; everything else is dropped on read
+COST_BUDGET_COL = "BudgetCode"
+COST_COLUMNS = [COST_BUDGET_COL, COST_DATE_COL, COST_VALUE_COL, COST_CATEGORY_COL, COST_FILTER_COL]
+EXCEL_BATCH_ROWS = 50_000
+
+# Multi-file uploads: a sheet is read when its header has these columns (matched
+# case-insensitively), and loaded rows are labelled with their file and sheet
+COST_REQUIRED_COLUMNS = [COST_BUDGET_COL, COST_DATE_COL, COST_VALUE_COL]
+INVENTORY_REQUIRED_COLUMNS = [INVENTORY_KEY_COL, INVENTORY_DATE_COL]
+SOURCE_COL = "Source"
+# Processes parsing sheets in parallel; None uses every core
+INGEST_WORKERS = None
+
+# Download payloads: exports from this many rows on are also offered in compact formats
+LARGE_EXPORT_ROWS = 50_000
+# Excel sheets hold at most 1,048,576 rows including the header
+EXCEL_MAX_ROWS = 1_048_575
+DOWNLOAD_CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+# Background jobs (see jobs.py): worker threads, finished jobs kept for reuse,
+# and how often a waiting page checks on its job
+JOB_WORKERS = 2
+JOB_KEEP_FINISHED = 16
+JOB_POLL_SECONDS = 1.0
+
+# Seconds from script start to the end of the post-login imports before a
+# warning is logged
+STARTUP_BUDGET_SECONDS = 2.0
+
+# HTTP API for other tools (see api_server.py). Binds to localhost by default;
+# if the token variable is set, requests must send 'Authorization: Bearer <token>'
+API_HOST = "127.0.0.1"
+API_PORT = 8502
+API_TOKEN_ENV = "MSF_API_TOKEN"
+API_MAX_BATCH = 100_000
+# Largest request body read; a full batch of projects is well under 256 bytes each
+API_MAX_BODY_BYTES = API_MAX_BATCH * 256
+# Serialised API responses kept for repeated requests, in bytes
+API_RESPONSE_CACHE_MAX_BYTES = 256 * 1024 ** 2
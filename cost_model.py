@@ -1,27 +1,110 @@
 # streamlit/cost_model.py
 
 import pandas as pd
-from config import INCLUDED_COST_CATEGORIES, COST_CATEGORY_COL, COST_FILTER_COL, COST_FILTER_VALUE, COST_DATE_COL, COST_VALUE_COL
+from aggregate_store import PartialAggregateStore, group_costs
+from budget_keys import canonical_code, canonical_mask
+from config import INCLUDED_COST_CATEGORIES, COST_CATEGORY_COL, COST_FILTER_COL, COST_DATE_COL, COST_VALUE_COL
+from instrumentation import timed
+from schema import actuals_mask, years_of
 
-def filter_and_group_costs(df: pd.DataFrame) -> pd.DataFrame:
-    # Always filter by cost category
-    filtered = df[df[COST_CATEGORY_COL].isin(INCLUDED_COST_CATEGORIES)]
+def filter_costs(df: pd.DataFrame) -> pd.DataFrame:
+    # Always filter by cost category, and drop rows that are not a project
+    # code (e.g. 'Total' rows, which would count every project twice)
+    filtered = df[df[COST_CATEGORY_COL].isin(INCLUDED_COST_CATEGORIES) & canonical_mask(df["BudgetCode"])]
 
     # Conditionally filter by 'Actuals/forecast' only if the column exists
     if COST_FILTER_COL in df.columns:
-        filtered = filtered[
-            filtered[COST_FILTER_COL].str.lower() == COST_FILTER_VALUE
-        ]
-
-    grouped = (
-        filtered
-        .groupby(["BudgetCode", COST_DATE_COL])[COST_VALUE_COL]
-        .sum()
-        .reset_index()
-    )
+        filtered = filtered[actuals_mask(filtered[COST_FILTER_COL])]
+    return filtered
+
+@timed()
+def filter_and_group_costs(df: pd.DataFrame, store: PartialAggregateStore = None,
+                           ledger: str = "default") -> pd.DataFrame:
+    filtered = filter_costs(df)
+    if store is None:
+        return group_costs(filtered)
+
+    # Only periods of this ledger that are new or changed since its last upload
+    # are regrouped; the rest come straight from the stored partial sums
+    grouped, _ = store.update(ledger, filtered)
     return grouped
+
+@timed()
 def summarize_annual_costs(grouped_df: pd.DataFrame) -> pd.DataFrame:
-    df = grouped_df.copy()
-    df["Year"] = df["DecisionMoment"].str.slice(0, 4)
-    summary = df.groupby(["BudgetCode", "Year"])["Total CHF"].sum().reset_index()
+    df = grouped_df.assign(Year=years_of(grouped_df["DecisionMoment"]))
+    summary = df.groupby(["BudgetCode", "Year"], observed=True)["Total CHF"].sum().reset_index()
     return summary
+
+# Holding cost column -> (inventory total, coefficient) it is derived from
+HOLDING_COST_BASES = {
+    "Annual cost (value-based)": ("TotalValueCHF", "CHF_per_Value"),
+    "Annual cost (m^3-based)": ("TotalVolumeM3", "CHF_per_m3"),
+    "Annual cost (kg-based)": ("TotalWeightKG", "CHF_per_kg"),
+}
+
+def median_rates(rate_df: pd.DataFrame) -> pd.Series:
+    # The MEDIAN summary row of a coefficient table, or None if it has none
+    # Match on the first word so 'Median (filtered)' counts but 'MEDIAN_CI_LOW' does not
+    first_word = rate_df["BudgetCode"].astype(str).str.strip().str.upper().str.split().str[0]
+    median_row = rate_df[first_word == "MEDIAN"]
+    if median_row.empty:
+        return None
+    return median_row.iloc[0]
+
+@timed()
+def estimate_holding_costs(inv_summary: pd.DataFrame, rates: pd.Series) -> pd.DataFrame:
+    # Multiply each project's inventory totals by one set of cost rates
+    df = inv_summary.copy()
+    for cost_col, (total_col, rate_col) in HOLDING_COST_BASES.items():
+        df[cost_col] = df[total_col] * rates[rate_col]
+
+    round_cols = [total for total, _ in HOLDING_COST_BASES.values()] + list(HOLDING_COST_BASES)
+    df[round_cols] = df[round_cols].round(2)
+
+    return df
+
+class CategoryCube:
+    # (BudgetCode, Year) -> category breakdown, built once per upload so the
+    # tab-1 drilldown is a dictionary lookup instead of a rescan of the ledger
+
+    COLUMNS = ["Cost category", COST_VALUE_COL]
+
+    def __init__(self, cost_df: pd.DataFrame):
+        years = years_of(cost_df[COST_DATE_COL])
+        budgets = cost_df["BudgetCode"]
+
+        # Distinct values only: the used categories of a typed frame, or a unique() pass
+        if isinstance(budgets.dtype, pd.CategoricalDtype):
+            distinct = budgets.cat.remove_unused_categories().cat.categories
+        else:
+            distinct = budgets.dropna().unique()
+        # Project codes only; 'Total' rows and other malformed values are not options
+        self.budget_options = sorted(b for b in distinct if canonical_code(b) == b)
+        self.year_options = sorted(int(y) for y in years.dropna().unique())
+
+        keep = budgets.notna() & years.notna()
+        if COST_FILTER_COL in cost_df.columns:
+            keep &= actuals_mask(cost_df[COST_FILTER_COL])
+
+        cube = (
+            pd.DataFrame({
+                "BudgetCode": budgets[keep].astype("category"),
+                "Year": years[keep].astype("int64").astype("category"),
+                "Cost category": cost_df.loc[keep, COST_CATEGORY_COL].astype("category"),
+                COST_VALUE_COL: cost_df.loc[keep, COST_VALUE_COL],
+            })
+            .groupby(["BudgetCode", "Year", "Cost category"], observed=True)[COST_VALUE_COL]
+            .sum()
+            .reset_index()
+            .sort_values(by=COST_VALUE_COL, ascending=False, kind="stable")
+        )
+        self._cells = {
+            key: cell[self.COLUMNS].astype({"Cost category": str}).reset_index(drop=True)
+            for key, cell in cube.groupby(["BudgetCode", "Year"], observed=True, sort=False)
+        }
+
+    def breakdown(self, budget: str, year: int) -> pd.DataFrame:
+        cell = self._cells.get((budget, year))
+        if cell is None:
+            return pd.DataFrame(columns=self.COLUMNS)
+        return cell
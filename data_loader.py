@@ -1,18 +1,329 @@
 # streamlit/data_loader.py
 
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import Callable, Iterator
+
+import numpy as np
+import openpyxl
 import pandas as pd
-import re
+from config import (
+    COST_BUDGET_COL, COST_CATEGORY_COL, COST_COLUMNS, COST_FILTER_COL, COST_FILTER_VALUE, COST_REQUIRED_COLUMNS,
+    EXCEL_BATCH_ROWS, INGEST_WORKERS, INVENTORY_REQUIRED_COLUMNS, SOURCE_COL,
+)
+from budget_keys import canonical_code
+from ingest_cache import read_upload_bytes, file_digest, cache_key, get_cached, put_cached
+from instrumentation import record_stage, stage, timed
+from schema import INVENTORY_SCHEMA, apply_cost_schema, apply_inventory_schema
 
-def load_excel(file) -> pd.DataFrame:
-    df = pd.read_excel(file)
+# Checksum of the full source row (every column, before projection), carried
+# through parsing so duplicate detection sees more than the projected columns
+ROW_HASH_COL = "_source_row_hash"
+
+
+def _canonical(name) -> str:
+    # Header names are matched ignoring case and surrounding whitespace
+    return str(name).strip().casefold() if name is not None else ""
+
+
+def _header(ws) -> list:
+    row = next(ws.iter_rows(max_row=1, values_only=True), None)
+    return [str(h).strip() if h is not None else "" for h in row or ()]
+
+
+def relevant_sheets(data: bytes, required: list) -> list:
+    # Names of the sheets whose header row contains every required column
+    needed = {_canonical(c) for c in required}
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        return [ws.title for ws in wb.worksheets if needed <= {_canonical(h) for h in _header(ws)}]
+    finally:
+        wb.close()
+
+
+def _row_hasher(header: list) -> Callable:
+    # Stable 64-bit checksum of a whole row, independent of the column order:
+    # cells are taken in sorted header order, and the header is part of the key
+    order = sorted(range(len(header)), key=lambda i: _canonical(header[i]))
+    salt = repr([_canonical(header[i]) for i in order]).encode("utf-8")
+    width = len(header)
+
+    def row_hash(row: tuple) -> int:
+        row = tuple(row) + (None,) * (width - len(row))
+        digest = hashlib.blake2b(salt + repr([row[i] for i in order]).encode("utf-8"), digest_size=8)
+        return int.from_bytes(digest.digest(), "little")
+
+    return row_hash
+
+
+def iter_excel_batches(data: bytes, columns: list = None, batch_size: int = EXCEL_BATCH_ROWS,
+                       sheet: str = None, row_hash: bool = False) -> Iterator[pd.DataFrame]:
+    # Stream one sheet (the first by default) in read-only mode, keeping only the
+    # requested columns under their configured names. With row_hash, each batch
+    # also gets ROW_HASH_COL computed from the full row.
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = (wb[sheet] if sheet is not None else wb.worksheets[0]).iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else "" for h in header]
+        wanted = {_canonical(c): c for c in columns} if columns is not None else None
+        positions = [i for i, name in enumerate(header) if wanted is None or _canonical(name) in wanted]
+        if not positions:
+            return
+        names = [wanted[_canonical(header[i])] if wanted is not None else header[i] for i in positions]
+        width = max(positions) + 1
+        pick = itemgetter(*positions)
+        hasher = _row_hasher(header) if row_hash else None
+
+        def frame(batch: list, hashes: list) -> pd.DataFrame:
+            df = pd.DataFrame.from_records(batch, columns=names)
+            if hasher is not None:
+                df[ROW_HASH_COL] = np.array(hashes, dtype=np.uint64)
+            return df
 
-    # Drop rows where BudgetCode is missing or not a valid project code
-    if "BudgetCode" in df.columns:
-        df = df[df["BudgetCode"].notna()]
-        df["BudgetCode"] = df["BudgetCode"].astype(str).str.strip()
-        
-        # Remove rows where BudgetCode is 'Total' or doesn't match expected format
-        df = df[~df["BudgetCode"].str.upper().eq("TOTAL")]
-        df = df[df["BudgetCode"].str.match(r"^[A-Z]{2}\d{3}$")]
+        batch, hashes = [], []
+        for row in rows:
+            # Read-only sheets may yield short rows when trailing cells are empty
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            values = pick(row)
+            if len(positions) == 1:
+                values = (values,)
+            if all(v is None for v in values):
+                continue
+            batch.append(values)
+            if hasher is not None:
+                hashes.append(hasher(row))
+            if len(batch) >= batch_size:
+                yield frame(batch, hashes)
+                batch, hashes = [], []
+        if batch:
+            yield frame(batch, hashes)
+    finally:
+        wb.close()
 
+
+def _normalise_budget_codes(codes: pd.Series) -> pd.Series:
+    # ' ao101 ' and 'AO101MCH' -> 'AO101', once per distinct value. Malformed
+    # values ('Total', typos) are kept stripped, so the joins can report them
+    # (budget_keys.unmatched_keys) and Tab 1 leaves them out (canonical_mask).
+    stripped = codes.astype(str).str.strip()
+    mapping = {raw: canonical_code(raw) or raw for raw in stripped.unique()}
+    return stripped.map(mapping)
+
+
+def _clean_budget_codes(df: pd.DataFrame) -> pd.DataFrame:
+    # Drop rows without a BudgetCode and normalise the rest
+    if COST_BUDGET_COL in df.columns:
+        df = df[df[COST_BUDGET_COL].notna()].copy()
+        df[COST_BUDGET_COL] = _normalise_budget_codes(df[COST_BUDGET_COL])
     return df
+
+
+def _filter_cost_batch(batch: pd.DataFrame, categories: list = None, actuals_only: bool = False) -> pd.DataFrame:
+    batch = _clean_budget_codes(batch)
+    if categories is not None and COST_CATEGORY_COL in batch.columns:
+        batch = batch[batch[COST_CATEGORY_COL].isin(categories)]
+    if actuals_only and COST_FILTER_COL in batch.columns:
+        batch = batch[batch[COST_FILTER_COL].astype(str).str.lower() == COST_FILTER_VALUE]
+    return batch
+
+
+# Sheet parsers. They run in worker processes, so they return their row counts
+# and timings (rows read, seconds, filter seconds) instead of recording stages.
+
+def _parse_cost_sheet(data: bytes, sheet: str, categories: list, actuals_only: bool,
+                      batch_size: int) -> tuple:
+    # Stream the sheet in batches, projecting to the cost columns and filtering
+    # each batch before it is kept, so the full sheet is never held in memory
+    start = time.perf_counter()
+    batches = []
+    rows_read = 0
+    filter_seconds = 0.0
+    for batch in iter_excel_batches(data, COST_COLUMNS, batch_size, sheet, row_hash=True):
+        rows_read += len(batch)
+        filter_start = time.perf_counter()
+        batches.append(_filter_cost_batch(batch, categories, actuals_only))
+        filter_seconds += time.perf_counter() - filter_start
+    df = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(columns=COST_COLUMNS + [ROW_HASH_COL])
+    return df, rows_read, time.perf_counter() - start, filter_seconds
+
+
+def _parse_inventory_sheet(data: bytes, sheet: str) -> tuple:
+    start = time.perf_counter()
+    df = pd.read_excel(io.BytesIO(data), sheet_name=sheet)
+    # Same case-insensitive header matching as the cost columns
+    wanted = {_canonical(c): c for c in INVENTORY_REQUIRED_COLUMNS + list(INVENTORY_SCHEMA)}
+    df = df.rename(columns=lambda c: wanted.get(_canonical(c), str(c).strip()))
+    return df, len(df), time.perf_counter() - start, 0.0
+
+
+_pool_context = None
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    # openpyxl parsing is pure Python and CPU-bound, so sheets are parsed in
+    # separate processes. The forkserver keeps this module (and pandas)
+    # imported, so new workers start without importing them again.
+    global _pool_context
+    if _pool_context is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _pool_context = multiprocessing.get_context("forkserver")
+            _pool_context.set_forkserver_preload([__name__])
+        else:
+            _pool_context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context)
+
+
+def _worker_count(tasks: int, workers: int = None) -> int:
+    return max(1, min(tasks, workers or INGEST_WORKERS or os.cpu_count() or 1))
+
+
+def _run_parsers(parse: Callable, tasks: list, workers: int = None) -> list:
+    # parse(*args) for each task, in order; a single task or worker stays in this process
+    workers = _worker_count(len(tasks), workers)
+    if workers == 1:
+        return [parse(*args) for args in tasks]
+    with _process_pool(workers) as pool:
+        return list(pool.map(parse, *zip(*tasks)))
+
+
+def _file_name(file) -> str:
+    name = getattr(file, "name", None)
+    if name is None and isinstance(file, (str, os.PathLike)):
+        name = os.path.basename(file)
+    return str(name) if name is not None else "upload"
+
+
+_sheet_index = {}
+
+
+def _sheets_of(digest: str, data: bytes, required: tuple) -> list:
+    # Relevant sheets per file content, remembered so cached reruns do not
+    # open the workbook again
+    key = (digest, required)
+    if key not in _sheet_index:
+        _sheet_index[key] = relevant_sheets(data, list(required))
+    return _sheet_index[key]
+
+
+def _drop_duplicate_rows(df: pd.DataFrame, codes: np.ndarray) -> tuple:
+    # A row is a duplicate when an identical row came from an earlier source,
+    # e.g. the same export uploaded twice or months repeated across files.
+    # Repeats within one sheet are kept: they can be genuine entries. Rows are
+    # compared in full: by ROW_HASH_COL where the parser projected the sheet.
+    if ROW_HASH_COL in df.columns:
+        hashes = df[ROW_HASH_COL].to_numpy()
+        df = df.drop(columns=ROW_HASH_COL)
+    else:
+        data_cols = [col for col in df.columns if col != SOURCE_COL]
+        hashes = pd.util.hash_pandas_object(df[data_cols], index=False).to_numpy()
+    first = pd.Series(codes).groupby(hashes, sort=False).transform("min").to_numpy()
+    duplicate = codes > first
+    sources = df[SOURCE_COL].cat.categories
+    report = pd.DataFrame({
+        SOURCE_COL: sources,
+        "Rows": np.bincount(codes, minlength=len(sources)),
+        "Duplicates": np.bincount(codes[duplicate], minlength=len(sources)),
+    })
+    if duplicate.any():
+        df = df[~duplicate].reset_index(drop=True)
+    return df, report
+
+
+def _fill_actuals(parts: list) -> list:
+    # A sheet without the Actuals/forecast column is kept whole when loaded on
+    # its own; next to sheets that have it, its rows would get missing values
+    # and be dropped as not actuals, so they are marked as actuals instead
+    if not any(COST_FILTER_COL in p.columns for p in parts):
+        return parts
+    return [p if COST_FILTER_COL in p.columns else p.assign(**{COST_FILTER_COL: COST_FILTER_VALUE}) for p in parts]
+
+
+def _load_sources(files: list, required: list, parse: Callable, params: tuple, apply: Callable,
+                  workers: int = None) -> tuple:
+    # Every relevant sheet of every file: cached sheets are reused, the rest are
+    # parsed in parallel, then all of them are reconciled into one typed frame
+    sources = []
+    for file in files:
+        data = read_upload_bytes(file)
+        digest = file_digest(data)
+        name = _file_name(file)
+        sheets = _sheets_of(digest, data, tuple(required))
+        if not sheets:
+            raise ValueError(f"{name}: no sheet has the columns {', '.join(required)}")
+        for sheet in sheets:
+            label = f"{name} [{sheet}]"
+            n = 2
+            while label in {s[0] for s in sources}:
+                label = f"{name} [{sheet}] #{n}"
+                n += 1
+            sources.append((label, data, sheet, cache_key(digest, parse.__name__, sheet, *params)))
+
+    parts = [get_cached(key) for _, _, _, key in sources]
+    missing = [i for i, part in enumerate(parts) if part is None]
+    if missing:
+        with stage("excel_parse") as record:
+            results = _run_parsers(parse, [(sources[i][1], sources[i][2]) + params for i in missing], workers)
+            record["rows_in"] = sum(rows_read for _, rows_read, _, _ in results)
+            record["rows_out"] = sum(len(df) for df, _, _, _ in results)
+            record["sheets"] = len(missing)
+            record["workers"] = _worker_count(len(missing), workers)
+        for i, (df, rows_read, _, filter_seconds) in zip(missing, results):
+            if parse is _parse_cost_sheet:
+                # BudgetCode validation and filters, summed over the sheet's batches
+                record_stage("budget_code_filter", filter_seconds, rows_read, len(df))
+            # Cached copies come back with a fresh RangeIndex; match that on a miss
+            parts[i] = df.reset_index(drop=True)
+            put_cached(sources[i][3], parts[i])
+
+    if parse is _parse_cost_sheet:
+        parts = _fill_actuals(parts)
+    with stage("reconcile_sources", sum(len(p) for p in parts)) as record:
+        # Columns missing from some sheets become missing values, and the schema
+        # gives each column one type whatever the individual sheets stored
+        df = apply(pd.concat(parts, ignore_index=True))
+        codes = np.repeat(np.arange(len(parts), dtype=np.intp), [len(p) for p in parts])
+        df[SOURCE_COL] = pd.Categorical.from_codes(codes, categories=[label for label, _, _, _ in sources])
+        df, report = _drop_duplicate_rows(df, codes)
+        record["rows_out"] = len(df)
+    return df, report
+
+
+@timed("load_cost_files")
+def load_cost_files(files: list, categories: list = None, actuals_only: bool = False,
+                    batch_size: int = EXCEL_BATCH_ROWS, workers: int = None) -> tuple:
+    # All sheets with the cost columns across the files, as one typed frame
+    # plus a report of rows and dropped duplicates per file and sheet.
+    # workers caps the parsing processes (default INGEST_WORKERS).
+    params = (sorted(categories) if categories is not None else None, actuals_only, batch_size)
+    return _load_sources(files, COST_REQUIRED_COLUMNS, _parse_cost_sheet, params, apply_cost_schema, workers)
+
+
+@timed("load_inventory_files")
+def load_inventory_files(files: list, workers: int = None) -> tuple:
+    return _load_sources(files, INVENTORY_REQUIRED_COLUMNS, _parse_inventory_sheet, (), apply_inventory_schema,
+                         workers)
+
+
+@timed("load_cost_excel")
+def load_cost_excel(file, categories: list = None, actuals_only: bool = False,
+                    batch_size: int = EXCEL_BATCH_ROWS, workers: int = None) -> pd.DataFrame:
+    return load_cost_files([file], categories, actuals_only, batch_size, workers)[0]
+
+
+@timed("load_inventory_excel")
+def load_inventory_excel(file, workers: int = None) -> pd.DataFrame:
+    # Inventory workbook with the typed schema applied (see schema.py)
+    return load_inventory_files([file], workers)[0]
+
+
+def load_excel(file) -> pd.DataFrame:
+    return load_cost_excel(file)
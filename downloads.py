@@ -0,0 +1,131 @@
+# streamlit/downloads.py
+
+import gzip
+import hashlib
+import io
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import openpyxl
+import pandas as pd
+from config import DOWNLOAD_CACHE_MAX_BYTES, EXCEL_MAX_ROWS, LARGE_EXPORT_ROWS
+from instrumentation import stage
+
+# Format -> (file extension, MIME type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def export_formats(df: pd.DataFrame) -> list:
+    # Small tables stay plain CSV; large ones are offered compact formats first
+    # (xlsx only while the table fits into one Excel sheet)
+    if len(df) < LARGE_EXPORT_ROWS:
+        return ["csv"]
+    if len(df) > EXCEL_MAX_ROWS:
+        return ["csv.gz", "parquet", "csv"]
+    return ["csv.gz", "parquet", "xlsx", "csv"]
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    # Content hash of values, column names and dtypes (the index is ignored,
+    # as it is never exported)
+    digest = hashlib.sha256()
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _cell(value):
+    # openpyxl wants plain Python values; missing values become empty cells
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, pd.Period):
+        return str(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _write_xlsx(df: pd.DataFrame) -> bytes:
+    # Write-only workbooks stream rows to disk instead of building a cell tree;
+    # they also accept rows past the sheet limit, giving a file Excel cannot open
+    if len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df)} rows do not fit into one Excel sheet")
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([str(c) for c in df.columns])
+    for row in df.itertuples(index=False, name=None):
+        ws.append([_cell(v) for v in row])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def serialize(df: pd.DataFrame, fmt: str) -> bytes:
+    with stage(f"export:{fmt}", len(df)):
+        if fmt == "csv":
+            return df.to_csv(index=False).encode("utf-8")
+        if fmt == "csv.gz":
+            return gzip.compress(df.to_csv(index=False).encode("utf-8"), compresslevel=6, mtime=0)
+        if fmt == "parquet":
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            return buffer.getvalue()
+        if fmt == "xlsx":
+            return _write_xlsx(df)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+class PayloadCache:
+    # Process-wide LRU of serialised payloads, bounded by total size in bytes
+
+    def __init__(self, max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, build: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        data = build()
+        with self._lock:
+            if key not in self._entries and len(data) <= self.max_bytes:
+                self._entries[key] = data
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_payloads = PayloadCache()
+
+
+def payload(df: pd.DataFrame, fmt: str, key: str = None) -> bytes:
+    # Serialised bytes for df, built at most once per content and format.
+    # Pass key when the caller already knows a content hash (e.g. of the upload).
+    return _payloads.get((key or frame_digest(df), fmt), lambda: serialize(df, fmt))
+
+
+def lazy_payload(df: pd.DataFrame, fmt: str, key: str = None) -> Callable[[], bytes]:
+    # Deferred form for st.download_button: nothing is hashed or serialised
+    # until the user actually clicks
+    return lambda: payload(df, fmt, key)
@@ -0,0 +1,188 @@
+# streamlit/ingest_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from config import INGEST_CACHE_DIR, INGEST_CACHE_MAX_BYTES, INGEST_CACHE_VERSION
+
+# Parsed workbooks are stored as uncompressed Arrow IPC (Feather v2) files so
+# later reruns and sessions can memory-map them instead of re-parsing Excel.
+_SUFFIX = ".arrow"
+
+
+def read_upload_bytes(file) -> bytes:
+    # Accept Streamlit UploadedFile objects, file-like objects and paths
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return f.read()
+    data = file.read()
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return data
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(digest: str, *parts: str) -> str:
+    # Combine the content digest with whatever determines how it was parsed
+    raw = "|".join((INGEST_CACHE_VERSION, digest) + tuple(str(p) for p in parts))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(INGEST_CACHE_DIR, key + _SUFFIX)
+
+
+# Schema metadata listing categorical columns whose categories are periods,
+# stored as text because Arrow cannot round-trip period dictionaries
+_PERIOD_CATEGORIES = b"msf_period_categories"
+
+
+def _encode_period_categories(df: pd.DataFrame) -> tuple:
+    periods = {
+        col: df[col].cat.categories.freqstr for col in df.columns
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and isinstance(df[col].cat.categories.dtype, pd.PeriodDtype)
+    }
+    if periods:
+        df = df.assign(**{col: df[col].cat.rename_categories(df[col].cat.categories.astype(str)) for col in periods})
+    return df, periods
+
+
+def _decode_period_categories(table: pa.Table) -> pd.DataFrame:
+    df = table.to_pandas()
+    periods = json.loads((table.schema.metadata or {}).get(_PERIOD_CATEGORIES, b"{}"))
+    for col, freq in periods.items():
+        df[col] = df[col].cat.rename_categories(pd.PeriodIndex(df[col].cat.categories, freq=freq))
+    return df
+
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    df, periods = _encode_period_categories(df)
+    table = _table_from_pandas(df)
+    if periods:
+        metadata = {**(table.schema.metadata or {}), _PERIOD_CATEGORIES: json.dumps(periods).encode("utf-8")}
+        table = table.replace_schema_metadata(metadata)
+    return table
+
+
+def _table_from_pandas(df: pd.DataFrame) -> pa.Table:
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Excel columns often mix numbers and text; store those as strings
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _write_entry(path: str, df: pd.DataFrame) -> None:
+    os.makedirs(INGEST_CACHE_DIR, exist_ok=True)
+    # Write to a temp file first so a concurrent reader never sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=INGEST_CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(_to_arrow(df), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_cached(key: str) -> pd.DataFrame:
+    # The cached frame for key, or None on a miss
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = _decode_period_categories(feather.read_table(path, memory_map=True))
+        # Refresh the modification time, which doubles as the LRU timestamp
+        os.utime(path)
+        return df
+    except (OSError, pa.ArrowInvalid):
+        # Corrupt or half-evicted entry: drop it so it is rebuilt
+        invalidate(key)
+        return None
+
+
+def put_cached(key: str, df: pd.DataFrame) -> None:
+    # Caching is best effort; failures leave the cache unchanged
+    try:
+        _write_entry(_entry_path(key), df)
+        evict(INGEST_CACHE_MAX_BYTES)
+    except (OSError, pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+
+def load_cached(key: str, build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    df = get_cached(key)
+    if df is not None:
+        return df
+    # Cached copies come back with a fresh RangeIndex; match that on a miss
+    df = build().reset_index(drop=True)
+    put_cached(key, df)
+    return df
+
+
+def _entries() -> list:
+    if not os.path.isdir(INGEST_CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(INGEST_CACHE_DIR):
+        if not name.endswith(_SUFFIX):
+            continue
+        path = os.path.join(INGEST_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def cache_size() -> int:
+    return sum(size for _, size, _ in _entries())
+
+
+def evict(max_bytes: int) -> int:
+    # Remove least recently used entries until the cache fits into max_bytes
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def invalidate(key: str = None) -> None:
+    # Drop a single entry, or the whole cache when no key is given
+    if key is not None:
+        try:
+            os.remove(_entry_path(key))
+        except FileNotFoundError:
+            pass
+        return
+    for _, _, path in _entries():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
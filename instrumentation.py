@@ -0,0 +1,140 @@
+# streamlit/instrumentation.py
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("msf_tool.stages")
+
+# Records of the current Streamlit rerun. Each script run happens in its own
+# thread, so a context variable keeps concurrent sessions apart.
+_records = contextvars.ContextVar("stage_records", default=None)
+# Optional callback told the name of every stage as it starts (see jobs.py)
+_listener = contextvars.ContextVar("stage_listener", default=None)
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def current_rss() -> int:
+    # Resident set size in bytes; /proc is a single cheap read on Linux
+    if _PAGE_SIZE is not None:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * _PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    # One JSON object per line on stderr; safe to call on every rerun
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+
+def start_run() -> list:
+    # Begin collecting stage records for this rerun
+    records = []
+    _records.set(records)
+    return records
+
+
+def records() -> list:
+    return list(_records.get() or [])
+
+
+def add_records(items: list) -> None:
+    # Attach records collected elsewhere (e.g. in a background job) to this run
+    collected = _records.get()
+    if collected is not None:
+        collected.extend(items)
+
+
+def set_stage_listener(callback) -> None:
+    # callback(stage_name) runs as each stage starts; it may raise to abort the work
+    _listener.set(callback)
+
+
+def _rows(obj):
+    try:
+        return len(obj) if hasattr(obj, "columns") else None
+    except TypeError:
+        return None
+
+
+@contextmanager
+def stage(name: str, rows_in: int = None):
+    # Times the block and records row counts and the RSS change. Set
+    # record["rows_out"] inside the block when the output size is known.
+    listener = _listener.get()
+    if listener is not None:
+        listener(name)
+    record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+    rss_before = current_rss()
+    start = time.perf_counter()
+    try:
+        yield record
+        record["status"] = "ok"
+    except BaseException:
+        record["status"] = "error"
+        raise
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        record["rss_delta_bytes"] = current_rss() - rss_before
+        collected = _records.get()
+        if collected is not None:
+            collected.append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"event": "stage", **record}))
+
+
+def record_stage(name: str, seconds: float, rows_in: int = None, rows_out: int = None) -> None:
+    # For work measured piecewise (e.g. summed over batches) rather than as one block
+    record = {"stage": name, "rows_in": rows_in, "rows_out": rows_out, "status": "ok",
+              "seconds": round(seconds, 6), "rss_delta_bytes": None}
+    collected = _records.get()
+    if collected is not None:
+        collected.append(record)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": "stage", **record}))
+
+
+def record_budget(name: str, seconds: float, budget_seconds: float) -> None:
+    # Record a measured phase and warn in the log when it exceeds its budget
+    record_stage(name, seconds)
+    if seconds > budget_seconds:
+        logger.warning(json.dumps({"event": "budget_exceeded", "stage": name,
+                                   "seconds": round(seconds, 6), "budget_seconds": budget_seconds}))
+
+
+def timed(name: str = None):
+    # Decorator form of stage(); row counts are taken from DataFrame arguments
+    # and return values when available
+    def decorator(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name, _rows(args[0]) if args else None) as record:
+                result = fn(*args, **kwargs)
+                record["rows_out"] = _rows(result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,217 @@
+# streamlit/jobs.py
+
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from aggregate_store import PartialAggregateStore, ledger_id
+from coefficient_store import CoefficientStore
+from config import JOB_KEEP_FINISHED, JOB_WORKERS
+from cost_coefficients import custom_cost_coefficients_with_unmatched
+from cost_model import CategoryCube, filter_and_group_costs, summarize_annual_costs
+from data_loader import load_cost_files, load_inventory_files
+from instrumentation import records, set_stage_listener, stage, start_run
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # One background computation. The worker thread updates status, step and
+    # stage; the UI only reads them.
+
+    def __init__(self, key: str, label: str, steps: list):
+        self.key = key
+        self.label = label
+        self.steps = list(steps)
+        self.status = "queued"
+        self.step_index = 0
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.records = []
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.watchers = set()
+        # Every watcher the job ever had; watchers is cleared once it finishes
+        self.seen_by = set()
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def progress(self) -> float:
+        if self.status == "done":
+            return 1.0
+        return self.step_index / len(self.steps) if self.steps else 0.0
+
+    @property
+    def step_name(self) -> str:
+        return self.steps[self.step_index] if self.step_index < len(self.steps) else None
+
+    def check(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.key)
+
+    def step(self, name: str) -> None:
+        # Called by the job function as it moves on to the next step
+        self.check()
+        self.step_index = self.steps.index(name)
+        self.stage = None
+
+    def _on_stage(self, name: str) -> None:
+        # Instrumented stages double as progress detail and cancellation points
+        self.check()
+        self.stage = name
+
+
+class JobRunner:
+    # Bounded pool of worker threads. Jobs are keyed by a hash of their inputs,
+    # so sessions submitting the same inputs share one computation.
+
+    def __init__(self, max_workers: int = JOB_WORKERS, keep_finished: int = JOB_KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="msf-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn: Callable, *args, label: str = None, steps: list = (),
+               watcher: str = None) -> Job:
+        # Run fn(job, *args) unless a usable job with this key already exists;
+        # finished jobs stay available until forget() or eviction
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or self._stale(job, watcher):
+                job = Job(key, label or getattr(fn, "__name__", "job"), steps)
+                self._jobs[key] = job
+                job.future = self._pool.submit(self._run, job, fn, args)
+                self._evict()
+            else:
+                self._jobs.move_to_end(key)
+            if watcher is not None and not job.done:
+                job.watchers.add(watcher)
+                job.seen_by.add(watcher)
+        return job
+
+    @staticmethod
+    def _stale(job: Job, watcher: str) -> bool:
+        # A cancelled (or cancelling) job is never handed out again. A failed
+        # one is kept for the sessions that watched it fail, so they see the
+        # error until they choose Run again; anyone else gets a fresh attempt.
+        if job.status == "cancelled" or job._cancel.is_set():
+            return True
+        return job.status == "failed" and (watcher is None or watcher not in job.seen_by)
+
+    def get(self, key: str) -> Job:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def cancel(self, key: str, watcher: str = None) -> bool:
+        # Withdraw one watcher's interest; the job only stops once nobody is
+        # waiting for it. Returns True if the job was cancelled.
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.done:
+                return False
+            job.watchers.discard(watcher)
+            if watcher is not None and job.watchers:
+                return False
+            job._cancel.set()
+            if job.future.cancel():
+                # Still queued: it will never start
+                job.status = "cancelled"
+                job.finished_at = time.time()
+            return True
+
+    def forget(self, key: str) -> None:
+        # Drop a finished job so the next submit recomputes it
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.done:
+                del self._jobs[key]
+
+    def jobs(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _evict(self) -> None:
+        finished = [key for key, job in self._jobs.items() if job.done]
+        for key in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[key]
+
+    def _run(self, job: Job, fn: Callable, args: tuple) -> None:
+        # Pool threads are reused, so the stage records and listener are reset per job
+        job.records = start_run()
+        set_stage_listener(job._on_stage)
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.check()
+            job.result = fn(job, *args)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = e
+            job.status = "failed"
+        finally:
+            set_stage_listener(None)
+            job.records = records()
+            job.finished_at = time.time()
+            with self._lock:
+                job.watchers.clear()
+                self._evict()
+
+
+# Pipelines submitted by the app. Uploads are passed as (file name, bytes)
+# pairs so the job does not depend on the session that started it.
+
+def _files(uploads: list) -> list:
+    files = []
+    for name, data in uploads:
+        file = io.BytesIO(data)
+        file.name = name
+        files.append(file)
+    return files
+
+
+COST_OVERVIEW_STEPS = ["Reading cost workbooks", "Grouping by project and month", "Summarising"]
+
+
+def cost_overview_job(job: Job, uploads: list, store: PartialAggregateStore) -> dict:
+    job.step("Reading cost workbooks")
+    cost_df, sources = load_cost_files(_files(uploads))
+    job.step("Grouping by project and month")
+    ledger = ledger_id([name for name, _ in uploads], cost_df["BudgetCode"])
+    grouped_df = filter_and_group_costs(cost_df, store=store, ledger=ledger)
+    job.step("Summarising")
+    annual_summary = summarize_annual_costs(grouped_df)
+    with stage("category_cube", len(cost_df)):
+        cube = CategoryCube(cost_df)
+    return {"grouped": grouped_df, "annual": annual_summary, "cube": cube, "sources": sources}
+
+
+COEFFICIENT_STEPS = ["Reading cost workbooks", "Reading inventory workbooks", "Calculating coefficients", "Saving"]
+
+
+def coefficient_job(job: Job, cost_uploads: list, inventory_uploads: list, mode: str,
+                    store: CoefficientStore, set_key: str, label: str) -> int:
+    job.step("Reading cost workbooks")
+    # Actuals are filtered while streaming the workbooks
+    cost_df, _ = load_cost_files(_files(cost_uploads), actuals_only=True)
+    job.step("Reading inventory workbooks")
+    inv_df, _ = load_inventory_files(_files(inventory_uploads))
+    job.step("Calculating coefficients")
+    table, unmatched = custom_cost_coefficients_with_unmatched(cost_df, inv_df, mode)
+    job.step("Saving")
+    return store.save(table, set_key, label=label, unmatched=unmatched)
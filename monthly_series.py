@@ -0,0 +1,164 @@
+# streamlit/monthly_series.py
+
+import numpy as np
+import pandas as pd
+from budget_keys import KeyIndex
+from coefficient_engine import COEFFICIENT_COLS, INVENTORY_TOTALS, numeric_matrix, per_distinct, safe_ratio
+from config import (
+    ANNUALIZATION_DIVISOR, COEFFICIENT_YEARS, COST_BUDGET_COL, COST_CATEGORY_COL, COST_DATE_COL, COST_FILTER_COL, COST_VALUE_COL,
+    INVENTORY_DATE_COL, INVENTORY_KEY_COL, ROLLING_WINDOW_MONTHS,
+)
+from cost_model import HOLDING_COST_BASES
+from instrumentation import timed
+from schema import actuals_mask, to_months
+
+MONTH_COL = "Month"
+MONTHS_PER_YEAR = 12
+# Month ordinal of rows without a readable date (pandas' NaT value)
+_NO_MONTH = np.iinfo(np.int64).min
+
+
+class MonthlyPanel:
+    # Dense (BudgetCode x month x column) sums over a contiguous month range.
+    # Months without rows are zeros, so trailing windows are plain differences
+    # of cumulative sums along the month axis.
+
+    def __init__(self, keys: pd.Index, months: pd.PeriodIndex, columns: list, values: np.ndarray):
+        self.keys = keys
+        self.months = months
+        self.columns = list(columns)
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def rolling(self, window: int) -> "MonthlyPanel":
+        # Sum over the trailing window months ending at each month; months
+        # with less than a full window of history are left out
+        if window < 1:
+            raise ValueError("window must be at least one month")
+        if window > len(self.months):
+            return MonthlyPanel(self.keys, self.months[:0], self.columns, self.values[:, :0])
+        cumulative = np.zeros((len(self.keys), len(self.months) + 1, len(self.columns)))
+        np.cumsum(self.values, axis=1, out=cumulative[:, 1:])
+        sums = cumulative[:, window:] - cumulative[:, :-window]
+        return MonthlyPanel(self.keys, self.months[window - 1:], self.columns, sums)
+
+    def reindex(self, keys: pd.Index, months: pd.PeriodIndex) -> "MonthlyPanel":
+        # The same sums on other keys and months; new cells are zeros
+        values = np.zeros((len(keys), len(months), len(self.columns)))
+        key_pos = keys.get_indexer(self.keys)
+        month_pos = months.get_indexer(self.months)
+        rows, cols = key_pos >= 0, month_pos >= 0
+        values[np.ix_(key_pos[rows], month_pos[cols])] = self.values[np.ix_(rows, cols)]
+        return MonthlyPanel(keys, months, self.columns, values)
+
+    def to_frame(self) -> pd.DataFrame:
+        # Long frame with one row per (BudgetCode, month)
+        n_keys, n_months = len(self.keys), len(self.months)
+        frame = pd.DataFrame(self.values.reshape(n_keys * n_months, len(self.columns)), columns=self.columns)
+        # Taken from the PeriodIndex so Month stays Period[M] even when empty
+        frame.insert(0, MONTH_COL, self.months[np.tile(np.arange(n_months), n_keys)])
+        frame.insert(0, COST_BUDGET_COL, pd.Categorical(np.repeat(self.keys, n_months), categories=self.keys))
+        return frame
+
+
+def _month_ordinals(values: pd.Series) -> np.ndarray:
+    # Month number per row (Period[M] ordinal), computed per distinct value
+    codes, ordinals = per_distinct(values, lambda u: np.asarray(to_months(u).asi8))
+    return np.where(codes >= 0, ordinals[codes], _NO_MONTH) if len(ordinals) else np.full(len(codes), _NO_MONTH)
+
+
+def bin_monthly(budget_codes: pd.Series, dates: pd.Series, values: np.ndarray, columns: list,
+                keys: KeyIndex = None) -> MonthlyPanel:
+    # Sum the value columns per (canonical BudgetCode, month) with one bincount per column
+    keys = KeyIndex() if keys is None else keys
+    codes = keys.encode(budget_codes)
+    labels = keys.labels
+    months = _month_ordinals(dates)
+    valid = (codes >= 0) & (months != _NO_MONTH)
+    codes, months, values = codes[valid], months[valid], np.nan_to_num(values[valid], nan=0.0)
+    if not len(codes):
+        return MonthlyPanel(labels[:0], pd.PeriodIndex([], freq="M"), columns, np.zeros((0, 0, len(columns))))
+
+    first = months.min()
+    n_months = months.max() - first + 1
+    cells = codes * n_months + (months - first)
+    size = len(labels) * n_months
+    dense = np.stack([
+        np.bincount(cells, weights=values[:, j], minlength=size).reshape(len(labels), n_months)
+        for j in range(len(columns))
+    ], axis=-1)
+
+    seen = np.bincount(codes, minlength=len(labels)) > 0
+    order = np.argsort(labels[seen])
+    month_index = pd.period_range(pd.Period(ordinal=first, freq="M"), periods=n_months, freq="M")
+    return MonthlyPanel(labels[seen][order], month_index, columns, dense[seen][order])
+
+
+@timed()
+def monthly_costs(cost_df: pd.DataFrame, categories: list = None, keys: KeyIndex = None) -> MonthlyPanel:
+    # Actual cost per BudgetCode and DecisionMoment month
+    cost_df = cost_df.rename(columns=str.strip)
+    mask = np.ones(len(cost_df), dtype=bool)
+    if COST_FILTER_COL in cost_df.columns:
+        mask &= actuals_mask(cost_df[COST_FILTER_COL])
+    if categories is not None:
+        mask &= cost_df[COST_CATEGORY_COL].isin(categories).to_numpy()
+    rows = cost_df[mask]
+    return bin_monthly(rows[COST_BUDGET_COL], rows[COST_DATE_COL], numeric_matrix(rows, [COST_VALUE_COL]),
+                       [COST_VALUE_COL], keys)
+
+
+@timed()
+def monthly_inventory(inventory_df: pd.DataFrame, value_col: str = "price_orderline",
+                      keys: KeyIndex = None) -> MonthlyPanel:
+    # Value, volume and weight delivered per project and actual_delivery_date month
+    inventory_df = inventory_df.rename(columns=str.strip)
+    values = numeric_matrix(inventory_df, [value_col, "order_volume_m3", "order_weight_kg"])
+    return bin_monthly(inventory_df[INVENTORY_KEY_COL], inventory_df[INVENTORY_DATE_COL], values,
+                       INVENTORY_TOTALS, keys)
+
+
+def _align(costs: MonthlyPanel, inventory: MonthlyPanel) -> tuple:
+    # Projects present on both sides, over the union of their month ranges
+    keys = costs.keys.intersection(inventory.keys).sort_values()
+    if not len(costs.months) or not len(inventory.months):
+        months = costs.months if len(costs.months) else inventory.months
+    else:
+        months = pd.period_range(min(costs.months[0], inventory.months[0]),
+                                 max(costs.months[-1], inventory.months[-1]), freq="M")
+    return costs.reindex(keys, months), inventory.reindex(keys, months)
+
+
+@timed()
+def rolling_coefficients(costs: MonthlyPanel, inventory: MonthlyPanel, window: int = ROLLING_WINDOW_MONTHS,
+                         divisor: float = ANNUALIZATION_DIVISOR) -> pd.DataFrame:
+    # compute_coefficients for every trailing window of months at once: the
+    # window's cost over divisor (default: the window in years) divided by the
+    # window's inventory totals. Rows are keyed by the window's last month.
+    costs, inventory = _align(costs, inventory)
+    cost_sums = costs.rolling(window).values[..., 0]
+    inventory_sums = inventory.rolling(window).values
+    annual = cost_sums / (divisor or window / MONTHS_PER_YEAR)
+    coefficients = safe_ratio(annual[..., None].repeat(len(INVENTORY_TOTALS), axis=-1), inventory_sums)
+
+    values = np.concatenate([annual[..., None], inventory_sums, coefficients], axis=-1)
+    columns = ["AvgAnnualCostCHF"] + INVENTORY_TOTALS + COEFFICIENT_COLS
+    return MonthlyPanel(costs.keys, costs.months[window - 1:], columns, values).to_frame()
+
+
+@timed()
+def rolling_holding_costs(inventory: MonthlyPanel, rates: pd.Series, window: int = ROLLING_WINDOW_MONTHS,
+                          rate_months: int = len(COEFFICIENT_YEARS) * MONTHS_PER_YEAR) -> pd.DataFrame:
+    # estimate_holding_costs for every trailing window. The rates are annual
+    # cost per unit delivered over rate_months (the coefficient years), so the
+    # window's totals are scaled by rate_months / window: every window gives an
+    # annual cost comparable with the estimate, and equals it when the window
+    # covers the coefficient years.
+    sums = inventory.rolling(window)
+    rate_values = np.array([rates[rate] for total, rate in HOLDING_COST_BASES.values()], dtype=np.float64)
+    order = [INVENTORY_TOTALS.index(total) for total, _ in HOLDING_COST_BASES.values()]
+    costs = sums.values[..., order] * rate_values * (rate_months / window)
+    values = np.concatenate([sums.values, costs], axis=-1)
+    return MonthlyPanel(sums.keys, sums.months, INVENTORY_TOTALS + list(HOLDING_COST_BASES), values).to_frame()
@@ -0,0 +1,83 @@
+# streamlit/robust_stats.py
+
+import numpy as np
+import pandas as pd
+from config import BOOTSTRAP_CONFIDENCE, BOOTSTRAP_RESAMPLES, BOOTSTRAP_SEED
+
+IQR_MODES = ("sequential", "joint")
+
+# Resampled values held in memory at once (resamples x rows x columns)
+_BOOTSTRAP_BATCH_ELEMENTS = 4_000_000
+
+_STATISTICS = {
+    "MEAN": lambda samples: samples.mean(axis=1),
+    "MEDIAN": lambda samples: np.median(samples, axis=1),
+}
+
+
+def iqr_bounds(values: np.ndarray, k: float = 1.5) -> tuple:
+    # Lower and upper fences of every column in one quantile call
+    q1, q3 = np.quantile(values, [0.25, 0.75], axis=0)
+    iqr = q3 - q1
+    return q1 - k * iqr, q3 + k * iqr
+
+
+def iqr_mask(values: np.ndarray, mode: str = "sequential", k: float = 1.5) -> np.ndarray:
+    # Rows of a 2-D array that lie inside the IQR fences of every column.
+    # 'joint' computes all fences once on the full data. 'sequential' matches the
+    # original column-by-column filter: each column's fences are computed on
+    # the rows kept by the previous columns (boolean mask only, no copies).
+    values = np.asarray(values, dtype=np.float64)
+    if mode == "joint":
+        low, high = iqr_bounds(values, k)
+        return ((values >= low) & (values <= high)).all(axis=1)
+    if mode != "sequential":
+        raise ValueError(f"Unknown IQR filter mode: {mode} (expected one of {', '.join(IQR_MODES)})")
+
+    keep = np.ones(len(values), dtype=bool)
+    for j in range(values.shape[1]):
+        if not keep.any():
+            break
+        low, high = iqr_bounds(values[keep, j], k)
+        keep &= (values[:, j] >= low) & (values[:, j] <= high)
+    return keep
+
+
+def bootstrap_ci(values: np.ndarray, statistics: tuple = ("MEAN", "MEDIAN"),
+                 n_resamples: int = BOOTSTRAP_RESAMPLES, confidence: float = BOOTSTRAP_CONFIDENCE,
+                 seed: int = BOOTSTRAP_SEED) -> dict:
+    # Percentile bootstrap intervals per column: {stat: (low, high)} with one
+    # value per column. Resamples are drawn as an index matrix and evaluated
+    # in batches, so memory stays bounded however many resamples are asked for.
+    values = np.asarray(values, dtype=np.float64)
+    n_rows, n_cols = values.shape
+    if n_rows == 0 or n_resamples <= 0:
+        nan = np.full(n_cols, np.nan)
+        return {stat: (nan, nan) for stat in statistics}
+
+    rng = np.random.default_rng(seed)
+    batch = max(1, _BOOTSTRAP_BATCH_ELEMENTS // (n_rows * n_cols))
+    estimates = {stat: np.empty((n_resamples, n_cols)) for stat in statistics}
+    for start in range(0, n_resamples, batch):
+        stop = min(start + batch, n_resamples)
+        samples = values[rng.integers(0, n_rows, size=(stop - start, n_rows))]
+        for stat in statistics:
+            estimates[stat][start:stop] = _STATISTICS[stat](samples)
+
+    alpha = (1 - confidence) / 2
+    return {
+        stat: tuple(np.quantile(estimates[stat], [alpha, 1 - alpha], axis=0))
+        for stat in statistics
+    }
+
+
+def ci_rows(df: pd.DataFrame, columns: list, label_col: str, **kwargs) -> pd.DataFrame:
+    # Bootstrap intervals as summary rows, e.g. MEAN_CI_LOW / MEAN_CI_HIGH
+    intervals = bootstrap_ci(df[columns].to_numpy(dtype=np.float64), **kwargs)
+    labels, rows = [], []
+    for stat, (low, high) in intervals.items():
+        labels += [f"{stat}_CI_LOW", f"{stat}_CI_HIGH"]
+        rows += [low, high]
+    out = pd.DataFrame(rows, columns=columns)
+    out.insert(0, label_col, labels)
+    return out
@@ -0,0 +1,91 @@
+# streamlit/scenario_engine.py
+
+import numpy as np
+import pandas as pd
+from coefficient_engine import COEFFICIENT_COLS, INVENTORY_TOTALS
+from config import COST_BUDGET_COL
+from cost_model import HOLDING_COST_BASES
+from instrumentation import stage, timed
+
+DEFAULT_PERCENTILES = [10, 25, 75, 90]
+
+# Basis labels in matrix column order (INVENTORY_TOTALS / COEFFICIENT_COLS)
+BASES = [basis for total in INVENTORY_TOTALS for basis, (t, _) in HOLDING_COST_BASES.items() if t == total]
+
+
+def scenario_rates(project_rates: pd.DataFrame, summary_rates: dict = None, percentiles: list = DEFAULT_PERCENTILES,
+                   include_projects: bool = True) -> pd.DataFrame:
+    # One row of cost rates per scenario: the summary rows (MEAN, MEDIAN),
+    # percentiles over the per-project rates and optionally every project's rates
+    rates = project_rates[COEFFICIENT_COLS].to_numpy(dtype=np.float64)
+    frames = []
+
+    summaries = {stat: row for stat, row in (summary_rates or {}).items() if row is not None}
+    if summaries:
+        frames.append(pd.DataFrame(
+            [[stat, "summary", *row[COEFFICIENT_COLS].astype(float)] for stat, row in summaries.items()],
+            columns=["Scenario", "Kind"] + COEFFICIENT_COLS,
+        ))
+
+    if percentiles and len(rates):
+        values = np.nanpercentile(rates, percentiles, axis=0)
+        frame = pd.DataFrame(values, columns=COEFFICIENT_COLS)
+        frame.insert(0, "Kind", "percentile")
+        frame.insert(0, "Scenario", [f"P{p:g}" for p in percentiles])
+        frames.append(frame)
+
+    if include_projects and len(rates):
+        frame = pd.DataFrame(rates, columns=COEFFICIENT_COLS)
+        frame.insert(0, "Kind", "project")
+        frame.insert(0, "Scenario", project_rates[COST_BUDGET_COL].astype(str).to_numpy())
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=["Scenario", "Kind"] + COEFFICIENT_COLS)
+    return pd.concat(frames, ignore_index=True).drop_duplicates("Scenario").reset_index(drop=True)
+
+
+@timed()
+def run_scenarios(inv_summary: pd.DataFrame, scenarios: pd.DataFrame) -> pd.DataFrame:
+    # Holding cost of every project under every scenario on every basis, in
+    # one batched product: (projects x bases) with (scenarios x bases) gives
+    # projects x scenarios x bases. Returned long (one row per combination)
+    # with categorical labels, so the UI can filter and pivot it freely.
+    totals = inv_summary[INVENTORY_TOTALS].to_numpy(dtype=np.float64)
+    rates = scenarios[COEFFICIENT_COLS].to_numpy(dtype=np.float64)
+    with stage("scenario_product", len(totals) * len(rates)):
+        costs = np.einsum("pb,sb->psb", totals, rates).round(2)
+
+    n_projects, n_scenarios, n_bases = costs.shape
+    project_index, projects = pd.factorize(inv_summary[COST_BUDGET_COL].astype(str))
+    scenario_labels = scenarios["Scenario"].astype(str)
+    kinds = pd.Categorical(scenarios["Kind"])
+
+    # Row order follows costs.ravel(): project, then scenario, then basis
+    project_codes = np.repeat(project_index, n_scenarios * n_bases)
+    scenario_codes = np.tile(np.repeat(np.arange(n_scenarios), n_bases), n_projects)
+    basis_codes = np.tile(np.arange(n_bases), n_projects * n_scenarios)
+    return pd.DataFrame({
+        COST_BUDGET_COL: pd.Categorical.from_codes(project_codes, categories=projects),
+        "Scenario": pd.Categorical.from_codes(scenario_codes, categories=scenario_labels),
+        "Kind": pd.Categorical.from_codes(kinds.codes[scenario_codes], categories=kinds.categories),
+        "Basis": pd.Categorical.from_codes(basis_codes, categories=BASES),
+        "HoldingCostCHF": costs.ravel(),
+    })
+
+
+def pivot_scenarios(result: pd.DataFrame, basis: str, scenarios: list = None,
+                    budget_codes: list = None) -> pd.DataFrame:
+    # BudgetCode x scenario table for one basis, from an existing run_scenarios result
+    mask = result["Basis"] == basis
+    if scenarios:
+        mask &= result["Scenario"].isin(scenarios)
+    if budget_codes:
+        mask &= result[COST_BUDGET_COL].isin(budget_codes)
+    table = result[mask].pivot_table(
+        index=COST_BUDGET_COL, columns="Scenario", values="HoldingCostCHF", observed=True, sort=False,
+    )
+    if scenarios:
+        table = table[[s for s in scenarios if s in table.columns]]
+    table.columns = table.columns.astype(str)
+    return table.reset_index()
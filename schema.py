@@ -0,0 +1,138 @@
+# streamlit/schema.py
+
+import numpy as np
+import pandas as pd
+from config import (
+    COST_BUDGET_COL, COST_CATEGORY_COL, COST_DATE_COL, COST_FILTER_COL, COST_FILTER_VALUE, COST_VALUE_COL,
+    INVENTORY_DATE_COL, INVENTORY_KEY_COL,
+)
+
+# Column -> storage kind, applied once when a workbook is loaded so later
+# steps work on category codes, booleans and months instead of strings:
+#   category  stripped text as a categorical (one copy of each distinct value)
+#   month     calendar month as a categorical of Period[M] values
+#   date      datetime64
+#   actuals   True for 'Actuals' rows, False otherwise
+#   number    numeric; integers are downcast to the smallest type that fits
+COST_SCHEMA = {
+    COST_BUDGET_COL: "category",
+    COST_CATEGORY_COL: "category",
+    COST_VALUE_COL: "number",
+    COST_DATE_COL: "month",
+    COST_FILTER_COL: "actuals",
+}
+
+INVENTORY_SCHEMA = {
+    INVENTORY_KEY_COL: "category",
+    INVENTORY_DATE_COL: "date",
+    "price_orderline": "number",
+    "invoiced_amount": "number",
+    "order_volume_m3": "number",
+    "order_weight_kg": "number",
+}
+
+
+def _recode(values: pd.Series, convert) -> pd.Series:
+    # Convert each distinct value once and rebuild the column as a categorical.
+    # convert maps an Index of distinct values to an Index of the same length;
+    # missing results become missing rows, equal results share one category.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    converted = convert(pd.Index(uniques))
+    new_codes, categories = pd.factorize(converted, sort=True)
+    codes = np.where(codes >= 0, new_codes[codes], -1) if len(new_codes) else codes
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=values.index, name=values.name)
+
+
+def _category(values: pd.Series) -> pd.Series:
+    return _recode(values, lambda u: u.astype(str).str.strip().where(u.notna()))
+
+
+def to_months(uniques: pd.Index) -> pd.Index:
+    # Period[M] per value: periods, dates or text such as '2023-11'
+    if isinstance(uniques.dtype, pd.PeriodDtype):
+        return uniques.asfreq("M")
+    dates = pd.to_datetime(uniques, errors="coerce", format="mixed")
+    return dates.to_period("M")
+
+
+def _month(values: pd.Series) -> pd.Series:
+    return _recode(values, to_months)
+
+
+def _date(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    dates = pd.to_datetime(pd.Index(uniques), errors="coerce", format="mixed")
+    return pd.Series(dates.take(codes, allow_fill=True), index=values.index, name=values.name)
+
+
+def _number(values: pd.Series) -> pd.Series:
+    # Floats keep float64: CHF amounts are not exact in float32 and would
+    # drift when summed
+    numeric = pd.to_numeric(values, errors="coerce")
+    if pd.api.types.is_integer_dtype(numeric):
+        return pd.to_numeric(numeric, downcast="integer")
+    return numeric
+
+
+def actuals_mask(values: pd.Series) -> np.ndarray:
+    # True for actuals rows; accepts the typed boolean column or raw text
+    if pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype=bool)
+    codes, uniques = pd.factorize(values)
+    is_actual = np.asarray(pd.Index(uniques).astype(str).str.strip().str.lower() == COST_FILTER_VALUE, dtype=bool)
+    return (codes >= 0) & is_actual[codes] if len(is_actual) else np.zeros(len(values), dtype=bool)
+
+
+def _actuals(values: pd.Series) -> pd.Series:
+    return pd.Series(actuals_mask(values), index=values.index, name=values.name)
+
+
+_CONVERTERS = {
+    "category": _category,
+    "month": _month,
+    "date": _date,
+    "actuals": _actuals,
+    "number": _number,
+}
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    # Typed copy of df; columns that are not in the schema are kept as they are
+    df = df.rename(columns=str.strip)
+    return df.assign(**{col: _CONVERTERS[kind](df[col]) for col, kind in schema.items() if col in df.columns})
+
+
+def apply_cost_schema(df: pd.DataFrame) -> pd.DataFrame:
+    return apply_schema(df, COST_SCHEMA)
+
+
+def apply_inventory_schema(df: pd.DataFrame) -> pd.DataFrame:
+    return apply_schema(df, INVENTORY_SCHEMA)
+
+
+def plain(values: pd.Series) -> pd.Series:
+    # A categorical column as its underlying values (e.g. Period[M] or str),
+    # for small results such as grouped sums
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.cat.categories.dtype)
+    return values
+
+
+def years_of(values: pd.Series) -> pd.Series:
+    # Calendar year per row (nullable Int64) for typed months, dates or text
+    # such as '2023-11'; computed once per distinct value
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Index(uniques)
+    if hasattr(uniques, "year"):
+        years = pd.array(uniques.year, dtype="Int64")
+    else:
+        years = pd.array(pd.to_numeric(uniques.astype(str).str.slice(0, 4), errors="coerce"), dtype="Int64")
+    return pd.Series(years.take(codes, allow_fill=True), index=values.index, name=values.name)
@@ -0,0 +1,125 @@
+# streamlit/tests/baseline_pipelines.py
+#
+# The three coefficient pipelines as they were before coefficient_engine.py
+# (cost_coefficients.py, the Tab 2 inline code and the Tab 3 inline code),
+# minus the Excel reads. The parity tests compare the engine against these.
+
+import pandas as pd
+from config import INCLUDED_COST_CATEGORIES
+
+COEFFICIENTS = ["CHF_per_Value", "CHF_per_m3", "CHF_per_kg"]
+ROUNDED = ["AvgAnnualCostCHF", "TotalValueCHF", "TotalVolumeM3", "TotalWeightKG"] + COEFFICIENTS
+
+
+def compute_cost_coefficients(cost_df: pd.DataFrame, inventory_df: pd.DataFrame) -> pd.DataFrame:
+    cost_df = cost_df.copy()
+    inventory_df = inventory_df.copy()
+    cost_df.columns = cost_df.columns.str.strip()
+    inventory_df.columns = inventory_df.columns.str.strip()
+
+    cost_df["Year"] = pd.to_datetime(cost_df["DecisionMoment"], errors="coerce").dt.year
+    inventory_df["Year"] = pd.to_datetime(inventory_df["actual_delivery_date"], errors="coerce").dt.year
+    cost_df = cost_df[cost_df["Year"].isin([2023, 2024])]
+    inventory_df = inventory_df[inventory_df["Year"].isin([2023, 2024])]
+
+    cost_df["BudgetCode"] = cost_df["BudgetCode"].str.strip()
+    inventory_df["project_id"] = inventory_df["project_id"].str.strip()
+    if "Actuals/forecast" in cost_df.columns:
+        cost_df = cost_df[cost_df["Actuals/forecast"].str.lower() == "actuals"]
+    cost_df = cost_df[cost_df["whatLVL1Desc"].isin(INCLUDED_COST_CATEGORIES)]
+
+    cost_summary = (
+        cost_df.groupby("BudgetCode")["Total CHF"].sum().div(2).reset_index()
+        .rename(columns={"Total CHF": "AvgAnnualCostCHF"})
+    )
+    inv_summary = (
+        inventory_df.groupby("project_id")[["invoiced_amount", "order_volume_m3", "order_weight_kg"]].sum()
+        .reset_index()
+        .rename(columns={
+            "project_id": "BudgetCode",
+            "invoiced_amount": "TotalValueCHF",
+            "order_volume_m3": "TotalVolumeM3",
+            "order_weight_kg": "TotalWeightKG",
+        })
+    )
+    merged = pd.merge(cost_summary, inv_summary, on="BudgetCode")
+    merged["CHF_per_Value"] = merged["AvgAnnualCostCHF"] / merged["TotalValueCHF"]
+    merged["CHF_per_m3"] = merged["AvgAnnualCostCHF"] / merged["TotalVolumeM3"]
+    merged["CHF_per_kg"] = merged["AvgAnnualCostCHF"] / merged["TotalWeightKG"]
+    return merged
+
+
+def iqr_filter(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    q1 = df[col].quantile(0.25)
+    q3 = df[col].quantile(0.75)
+    iqr = q3 - q1
+    return df[(df[col] >= q1 - 1.5 * iqr) & (df[col] <= q3 + 1.5 * iqr)]
+
+
+def tab2_inputs(cost_df: pd.DataFrame, inv_df: pd.DataFrame) -> pd.DataFrame:
+    # Per-project coefficients before the NaN drop, IQR filter and rounding
+    cost_df = cost_df.copy()
+    inv_df = inv_df.copy()
+    cost_df["Year"] = cost_df["DecisionMoment"].astype(str).str[:4]
+    cost_df = cost_df[cost_df["Year"].isin(["2023", "2024"])]
+    if "Actuals/forecast" in cost_df.columns:
+        cost_df = cost_df[cost_df["Actuals/forecast"].str.lower() == "actuals"]
+    cost_df["Total CHF"] = pd.to_numeric(cost_df["Total CHF"], errors="coerce")
+    cost_agg = cost_df.groupby("BudgetCode")["Total CHF"].sum().reset_index()
+    cost_agg["AvgAnnualCostCHF"] = cost_agg["Total CHF"] / 2
+
+    inv_df["actual_delivery_date"] = pd.to_datetime(inv_df["actual_delivery_date"], errors="coerce")
+    inv_df = inv_df[inv_df["actual_delivery_date"].astype(str).str.startswith(("2023", "2024"))]
+    inv_df["BudgetCode"] = inv_df["project_id"].astype(str).str[:-3]
+    for col in ["price_orderline", "order_volume_m3", "order_weight_kg"]:
+        inv_df[col] = pd.to_numeric(inv_df[col], errors="coerce")
+    inv_agg = inv_df.groupby("BudgetCode").agg(
+        TotalValueCHF=("price_orderline", "sum"),
+        TotalVolumeM3=("order_volume_m3", "sum"),
+        TotalWeightKG=("order_weight_kg", "sum"),
+    ).reset_index()
+
+    merged = pd.merge(cost_agg[["BudgetCode", "AvgAnnualCostCHF"]], inv_agg, on="BudgetCode", how="inner")
+    merged["CHF_per_Value"] = merged["AvgAnnualCostCHF"] / merged["TotalValueCHF"]
+    merged["CHF_per_m3"] = merged["AvgAnnualCostCHF"] / merged["TotalVolumeM3"]
+    merged["CHF_per_kg"] = merged["AvgAnnualCostCHF"] / merged["TotalWeightKG"]
+    return merged
+
+
+def tab2_coefficients(cost_df: pd.DataFrame, inv_df: pd.DataFrame) -> pd.DataFrame:
+    merged = tab2_inputs(cost_df, inv_df).dropna()
+    for col in COEFFICIENTS:
+        merged = iqr_filter(merged, col)
+    merged[ROUNDED] = merged[ROUNDED].round(2)
+
+    summary = pd.DataFrame({
+        "BudgetCode": ["MEAN", "MEDIAN"],
+        **{col: [merged[col].mean(), merged[col].median()] for col in ROUNDED},
+    }).round(2)
+    return pd.concat([summary, merged], ignore_index=True)
+
+
+def tab3_holding_costs(inventory_df: pd.DataFrame, rate_df: pd.DataFrame) -> pd.DataFrame:
+    inventory_df = inventory_df.copy()
+    inventory_df["actual_delivery_date"] = pd.to_datetime(inventory_df["actual_delivery_date"], errors="coerce")
+    inventory_df["Year"] = inventory_df["actual_delivery_date"].dt.year
+    inventory_df = inventory_df[inventory_df["Year"].isin([2023, 2024])]
+    inventory_df["BudgetCode"] = inventory_df["project_id"].astype(str).str.strip()
+    inv_summary = (
+        inventory_df.groupby("BudgetCode")
+        .agg(
+            TotalValueCHF=("price_orderline", "sum"),
+            TotalVolumeM3=("order_volume_m3", "sum"),
+            TotalWeightKG=("order_weight_kg", "sum"),
+        )
+        .reset_index()
+    )
+    median_rates = rate_df[rate_df["BudgetCode"].str.contains("MEDIAN", case=False, na=False)].iloc[0]
+    inv_summary["Annual cost (value-based)"] = inv_summary["TotalValueCHF"] * median_rates["CHF_per_Value"]
+    inv_summary["Annual cost (m^3-based)"] = inv_summary["TotalVolumeM3"] * median_rates["CHF_per_m3"]
+    inv_summary["Annual cost (kg-based)"] = inv_summary["TotalWeightKG"] * median_rates["CHF_per_kg"]
+    for col in ["TotalValueCHF", "TotalVolumeM3", "TotalWeightKG",
+                "Annual cost (value-based)", "Annual cost (m^3-based)", "Annual cost (kg-based)"]:
+        inv_summary[col] = inv_summary[col].round(2)
+    inv_summary["BudgetCode"] = inv_summary["BudgetCode"].str.replace("MCH$", "", regex=True)
+    return inv_summary
@@ -0,0 +1,53 @@
+# streamlit/tests/conftest.py
+#
+# Run from the project root:
+#
+#   python -m pytest -q
+
+import io
+import os
+import sys
+
+import openpyxl
+
+import pytest
+
+# The app modules are flat files in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_cost_ledger, generate_inventory  # noqa: E402
+
+
+@pytest.fixture
+def workbook():
+    # Builds an in-memory upload: workbook(name, header, rows)
+    def build(name: str, header: list, rows: list) -> io.BytesIO:
+        wb = openpyxl.Workbook()
+        wb.active.append(header)
+        for row in rows:
+            wb.active.append(row)
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        file = io.BytesIO(buffer.getvalue())
+        file.name = name
+        return file
+    return build
+
+
+@pytest.fixture
+def ingest_cache_dir(tmp_path, monkeypatch):
+    # Loader tests parse into a throwaway ingest cache, not the project's .cache
+    import ingest_cache
+    monkeypatch.setattr(ingest_cache, "INGEST_CACHE_DIR", str(tmp_path / "ingest"))
+    return tmp_path / "ingest"
+
+
+@pytest.fixture(scope="session")
+def cost_df():
+    return generate_cost_ledger(50_000, n_budget_codes=60, seed=1)
+
+
+@pytest.fixture(scope="session")
+def inventory_df():
+    # project_id carries the three-letter mission suffix, e.g. 'AA100MCH'
+    return generate_inventory(50_000, n_budget_codes=60, seed=2)
@@ -0,0 +1,45 @@
+# streamlit/tests/test_aggregate_store.py
+
+import pandas as pd
+
+from aggregate_store import PartialAggregateStore, group_costs, ledger_id
+from cost_model import filter_costs
+
+
+def _ledger(codes: list, amount: float = 100.0) -> pd.DataFrame:
+    months = ["2023-01", "2023-02", "2024-01"]
+    return pd.DataFrame({
+        "BudgetCode": [c for c in codes for _ in months],
+        "whatLVL1Desc": "CONSTRUCTION",
+        "Total CHF": amount,
+        "DecisionMoment": months * len(codes),
+        "Actuals/forecast": "Actuals",
+    })
+
+
+def test_ledger_id_tells_missions_with_the_same_file_name_apart():
+    mission_a, mission_b = _ledger(["AO101", "AO102"]), _ledger(["BF104"])
+    assert ledger_id(["export.xlsx"], mission_a["BudgetCode"]) != ledger_id(["export.xlsx"], mission_b["BudgetCode"])
+    # File order, case and the row order of the codes do not matter
+    assert ledger_id(["B.xlsx", "a.xlsx"], mission_a["BudgetCode"]) == \
+        ledger_id(["A.xlsx", "b.xlsx"], mission_a["BudgetCode"][::-1].astype("category"))
+
+
+def test_missions_do_not_rewrite_each_others_periods(tmp_path):
+    store = PartialAggregateStore(str(tmp_path))
+    uploads = {"a": filter_costs(_ledger(["AO101", "AO102"])), "b": filter_costs(_ledger(["BF104"]))}
+    ledgers = {m: ledger_id(["export.xlsx"], df["BudgetCode"]) for m, df in uploads.items()}
+
+    for mission, filtered in uploads.items():
+        grouped, changed = store.update(ledgers[mission], filtered)
+        assert len(changed) == 3
+        pd.testing.assert_frame_equal(grouped, group_costs(filtered).sort_values(["BudgetCode", "DecisionMoment"])
+                                      .reset_index(drop=True))
+
+    # Mission a again, with one month edited: only that month is regrouped
+    edited = _ledger(["AO101", "AO102"])
+    edited.loc[edited["DecisionMoment"] == "2024-01", "Total CHF"] = 50.0
+    grouped, changed = store.update(ledgers["a"], filter_costs(edited))
+    assert changed == ["2024-01"]
+    assert grouped.groupby("DecisionMoment")["Total CHF"].sum().to_dict() == \
+        {"2023-01": 200.0, "2023-02": 200.0, "2024-01": 100.0}
@@ -0,0 +1,97 @@
+# streamlit/tests/test_api_server.py
+
+import http.client
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from api_server import _TOTALS, CoefficientService, make_server
+from coefficient_engine import ROUNDED_COLS, aggregate_inventory
+from coefficient_store import CoefficientStore
+from config import API_MAX_BODY_BYTES, COST_BUDGET_COL, DEFAULT_COEFFICIENTS_PATH
+from cost_model import HOLDING_COST_BASES, estimate_holding_costs, median_rates
+
+TOKEN = "secret"
+
+
+def test_holding_costs_match_estimate_holding_costs(tmp_path, inventory_df):
+    # The API prices projects with its own NumPy product; it must give what
+    # Tab 3 gives for the same totals and rates
+    service = CoefficientService(CoefficientStore(str(tmp_path / "store.sqlite")))
+    summary = aggregate_inventory(inventory_df)
+    summary = summary.assign(BudgetCode=summary["BudgetCode"].astype(str))
+    projects = summary[[COST_BUDGET_COL] + _TOTALS].to_dict("records")
+
+    answer = service.holding_costs(service.default_set_id, {"rates": "MEDIAN", "projects": projects})
+    actual = pd.DataFrame(answer["projects"]).set_index(COST_BUDGET_COL)
+    expected = estimate_holding_costs(summary, median_rates(pd.read_csv(DEFAULT_COEFFICIENTS_PATH)))
+    expected = expected.set_index(COST_BUDGET_COL)
+
+    columns = _TOTALS + list(HOLDING_COST_BASES)
+    assert list(actual.index) == list(expected.index)
+    np.testing.assert_array_equal(actual[columns].to_numpy(), expected[columns].to_numpy())
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    server = make_server(port=0, db_path=str(tmp_path_factory.mktemp("api") / "store.sqlite"), token=TOKEN)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+
+
+def _post(address: tuple, headers: dict, body: bytes = b"") -> tuple:
+    conn = http.client.HTTPConnection(*address, timeout=10)
+    conn.putrequest("POST", "/sets/default/holding-costs")
+    for name, value in headers.items():
+        conn.putheader(name, value)
+    conn.endheaders(body)
+    response = conn.getresponse()
+    answer = response.status, json.loads(response.read()), response.getheader("Connection")
+    conn.close()
+    return answer
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1_0"])
+def test_bad_content_length_is_a_400(server, length):
+    status, body, connection = _post(server, {"Authorization": "Bearer " + TOKEN, "Content-Length": length})
+    assert status == 400 and body == {"error": "invalid Content-Length"}
+    assert connection == "close"
+
+
+def test_oversized_body_is_refused_before_reading_it(server):
+    headers = {"Authorization": "Bearer " + TOKEN, "Content-Length": str(API_MAX_BODY_BYTES + 1)}
+    status, _, connection = _post(server, headers)
+    assert status == 413 and connection == "close"
+
+
+def test_token_is_checked_before_the_body(server):
+    # Nothing of the announced body is sent; the 401 must come anyway
+    status, _, connection = _post(server, {"Content-Length": "1000000"})
+    assert status == 401 and connection == "close"
+
+
+def test_authorised_post(server):
+    body = json.dumps({"projects": [{COST_BUDGET_COL: "AO101", **dict.fromkeys(_TOTALS, 1.0)}]}).encode("utf-8")
+    headers = {"Authorization": "Bearer " + TOKEN, "Content-Length": str(len(body))}
+    status, answer, _ = _post(server, headers, body)
+    assert status == 200 and answer["rates"] == "MEDIAN"
+
+
+def test_project_rates_fall_back_to_median_for_a_summary_only_set(tmp_path):
+    service = CoefficientService(CoefficientStore(str(tmp_path / "store.sqlite")))
+    summary_only = tmp_path / "summary_only.csv"
+    pd.DataFrame([["MEAN"] + [2.0] * len(ROUNDED_COLS), ["MEDIAN"] + [1.0] * len(ROUNDED_COLS)],
+                 columns=[COST_BUDGET_COL] + ROUNDED_COLS).to_csv(summary_only, index=False)
+    set_id = service.store.import_csv(str(summary_only), label="summary rows only")
+
+    projects = [{COST_BUDGET_COL: code, **dict.fromkeys(_TOTALS, 1.0)} for code in ("AO101", "BF104")]
+    answer = service.holding_costs(set_id, {"rates": "project", "projects": projects})
+    assert [p["RateSource"] for p in answer["projects"]] == ["MEDIAN", "MEDIAN"]
+    assert answer["unmatched"] == ["AO101", "BF104"]
+    assert answer["projects"][0][next(iter(HOLDING_COST_BASES))] == 1.0
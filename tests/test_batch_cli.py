@@ -0,0 +1,28 @@
+# streamlit/tests/test_batch_cli.py
+
+from batch_cli import pair_ledgers
+
+
+def test_pairs_by_name_and_reports_unpaired_ledgers():
+    pairs, unmatched, clashes = pair_ledgers(
+        ["l/AO101_cost.xlsx", "l/BF104_cost.xlsx", "l/KE/cost.xlsx"],
+        ["l/AO101_inventory.xlsx", "l/CD200_inventory.xlsx", "l/KE/inventory.xlsx"],
+        "cost", "inventory",
+    )
+    assert pairs == {
+        "ao101": ("l/AO101_cost.xlsx", "l/AO101_inventory.xlsx"),
+        "ke": ("l/KE/cost.xlsx", "l/KE/inventory.xlsx"),
+    }
+    assert unmatched == ["bf104", "cd200"]
+    assert clashes == {}
+
+
+def test_colliding_ledger_names_are_reported_not_overwritten():
+    pairs, unmatched, clashes = pair_ledgers(
+        ["l/AO/2024_cost.xlsx", "l/BF/2024_cost.xlsx", "l/AO101_cost.xlsx"],
+        ["l/AO/2024_inventory.xlsx", "l/AO101_inventory.xlsx"],
+        "cost", "inventory",
+    )
+    assert list(pairs) == ["ao101"]
+    assert unmatched == []
+    assert clashes == {"2024": ["l/AO/2024_cost.xlsx", "l/BF/2024_cost.xlsx"]}
@@ -0,0 +1,38 @@
+# streamlit/tests/test_budget_keys.py
+
+import pandas as pd
+
+from budget_keys import canonical_mask
+from coefficient_engine import coefficient_inputs
+from cost_model import filter_and_group_costs
+from data_loader import load_cost_excel
+
+COST_HEADER = ["BudgetCode", "whatLVL1Desc", "Total CHF", "DecisionMoment", "Actuals/forecast"]
+
+
+def test_cost_loader_normalises_codes_and_keeps_malformed_ones_visible(workbook, ingest_cache_dir):
+    codes = ["AO101", " ao102 ", "AO103MCH", "Total", "XX"]
+    rows = [[c, "CONSTRUCTION", 100.0, "2023-05", "Actuals"] for c in codes]
+    cost = load_cost_excel(workbook("cost.xlsx", COST_HEADER, rows), workers=1)
+    assert any(ingest_cache_dir.iterdir())
+    assert list(cost["BudgetCode"].astype(str)) == ["AO101", "AO102", "AO103", "Total", "XX"]
+
+    inventory = pd.DataFrame({
+        "project_id": ["AO101MCH", "AO102MCH", "AO103MCH"],
+        "actual_delivery_date": "2023-06-01",
+        "price_orderline": 10.0,
+        "order_volume_m3": 1.0,
+        "order_weight_kg": 1.0,
+    })
+    merged, unmatched = coefficient_inputs(cost, inventory)
+    assert list(merged["BudgetCode"]) == ["AO101", "AO102", "AO103"]
+    assert unmatched.to_dict("list") == {"BudgetCode": ["Total", "XX"], "Issue": ["not a project code"] * 2}
+
+    # Tab 1 sums leave the malformed rows out
+    assert list(filter_and_group_costs(cost)["BudgetCode"]) == ["AO101", "AO102", "AO103"]
+
+
+def test_canonical_mask():
+    values = pd.Series(["AO101", "AO101MCH", " AO101", "Total", None])
+    assert canonical_mask(values).tolist() == [True, False, False, False, False]
+    assert canonical_mask(values.astype("category")).tolist() == [True, False, False, False, False]
@@ -0,0 +1,171 @@
+# streamlit/tests/test_coefficient_parity.py
+#
+# coefficient_engine.py against the three pipelines it replaced
+# (tests/baseline_pipelines.py). The engine sums with np.bincount where the
+# old code used pandas groupby sums (compensated summation), so unrounded
+# values agree to floating point precision, and values rounded to 2 decimals
+# may differ by one step (0.01) when they sit on a rounding boundary.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from coefficient_engine import ROUNDED_COLS, aggregate_inventory, compute_coefficients
+from config import DEFAULT_COEFFICIENTS_PATH
+from cost_coefficients import compute_cost_coefficients, custom_cost_coefficients
+from cost_model import HOLDING_COST_BASES, estimate_holding_costs, median_rates
+from robust_stats import iqr_mask
+from schema import apply_cost_schema, apply_inventory_schema
+from tests import baseline_pipelines as baseline
+
+# Relative difference allowed between unrounded engine and baseline values
+RTOL = 1e-12
+# One rounding step (plus float slack) for values rounded to 2 decimals
+ROUNDING_STEP = 0.01 + 1e-9
+SUMMARY_ROWS = ["MEAN", "MEDIAN"]
+
+
+def by_code(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(BudgetCode=df["BudgetCode"].astype(str)).set_index("BudgetCode").sort_index()
+
+
+def assert_rounding_parity(actual: pd.DataFrame, expected: pd.DataFrame, columns: list,
+                           max_changed: float = 1.0) -> None:
+    # Same rows; rounded values equal up to one rounding step, and at most
+    # max_changed of them not exactly equal
+    assert list(actual.index) == list(expected.index)
+    diff = np.abs(actual[columns].to_numpy(dtype=float) - expected[columns].to_numpy(dtype=float))
+    assert np.nanmax(diff) <= ROUNDING_STEP
+    assert (diff > 1e-9).mean() <= max_changed
+
+
+def projects(table: pd.DataFrame) -> pd.DataFrame:
+    # Rows other than MEAN, MEDIAN and their confidence intervals
+    return table[~table["BudgetCode"].astype(str).str.match(r"^(MEAN|MEDIAN)")]
+
+
+@pytest.fixture(params=["raw", "typed"])
+def engine_frames(request, cost_df, inventory_df):
+    # The engine is fed both raw frames and the typed frames the app uses;
+    # the baseline code does string operations and always gets raw frames
+    if request.param == "typed":
+        return apply_cost_schema(cost_df.copy()), apply_inventory_schema(inventory_df.copy())
+    return cost_df, inventory_df
+
+
+def test_compute_cost_coefficients_matches_baseline(engine_frames, cost_df, inventory_df):
+    cost, inventory = engine_frames
+    # The old headless pipeline joined project_id to BudgetCode verbatim, so it
+    # only matched inventory without the mission suffix; the engine takes both
+    unsuffixed = inventory_df.assign(project_id=inventory_df["project_id"].str[:-3])
+    expected = by_code(baseline.compute_cost_coefficients(cost_df, unsuffixed))
+
+    for inv in (unsuffixed, inventory):
+        actual = by_code(compute_cost_coefficients(cost, inv))
+        assert list(actual.index) == list(expected.index)
+        np.testing.assert_allclose(actual[ROUNDED_COLS], expected[ROUNDED_COLS], rtol=RTOL)
+
+
+def test_tab2_inputs_match_baseline(engine_frames, cost_df, inventory_df):
+    cost, inventory = engine_frames
+    actual = by_code(compute_coefficients(cost, inventory))
+    expected = by_code(baseline.tab2_inputs(cost_df, inventory_df))
+    assert list(actual.index) == list(expected.index)
+    np.testing.assert_allclose(actual[ROUNDED_COLS], expected[ROUNDED_COLS], rtol=RTOL)
+
+
+def test_tab2_table_matches_baseline(engine_frames, cost_df, inventory_df):
+    cost, inventory = engine_frames
+    table = custom_cost_coefficients(cost, inventory, mode="sequential")
+    expected = baseline.tab2_coefficients(cost_df, inventory_df)
+
+    # The engine adds confidence interval rows after MEAN and MEDIAN
+    actual_summary = table.set_index("BudgetCode").loc[SUMMARY_ROWS]
+    assert_rounding_parity(actual_summary, expected.set_index("BudgetCode").loc[SUMMARY_ROWS], ROUNDED_COLS)
+
+    assert_rounding_parity(by_code(projects(table)), by_code(projects(expected)), ROUNDED_COLS, max_changed=0.05)
+
+
+def test_tab3_holding_costs_match_baseline(engine_frames, inventory_df):
+    _, inventory = engine_frames
+    rate_df = pd.read_csv(DEFAULT_COEFFICIENTS_PATH)
+    actual = by_code(estimate_holding_costs(aggregate_inventory(inventory), median_rates(rate_df)))
+    expected = by_code(baseline.tab3_holding_costs(inventory_df, rate_df))
+
+    columns = [total for total, _ in HOLDING_COST_BASES.values()] + list(HOLDING_COST_BASES)
+    assert_rounding_parity(actual, expected, columns, max_changed=0.05)
+
+
+def _ledgers(inventory_rows: list) -> tuple:
+    cost = pd.DataFrame({
+        "BudgetCode": ["AA100", "AA100", "AB100", "AC100", "AD100", "AD100"],
+        "whatLVL1Desc": "WAREHOUSE",
+        "Total CHF": [1000.0, "n/a", 500.0, 0.0, 300.0, np.nan],
+        "DecisionMoment": ["2023-01", "2023-02", "2024-03", "2024-04", "2023-05", "2024-06"],
+        "Actuals/forecast": "Actuals",
+    })
+    inventory = pd.DataFrame(inventory_rows, columns=[
+        "project_id", "actual_delivery_date", "price_orderline", "order_volume_m3", "order_weight_kg",
+    ])
+    return cost, inventory
+
+
+def test_zero_and_missing_denominators_give_nan():
+    cost, inventory = _ledgers([
+        # AA100 has no volume at all
+        ("AA100MCH", "2023-03-01", 200.0, 0.0, 10.0),
+        ("AA100MCH", "2024-03-01", 300.0, 0.0, np.nan),
+        # AB100 has a missing weight on one row only
+        ("AB100MCH", "2023-03-01", 100.0, 1.0, np.nan),
+        ("AB100MCH", "2024-03-01", 100.0, 1.0, 5.0),
+        # AC100 has zero cost; AD100 has nothing but zeros
+        ("AC100MCH", "2023-03-01", 100.0, 1.0, 1.0),
+        ("AD100MCH", "2023-03-01", 0.0, 0.0, 0.0),
+        # Unreadable date: left out
+        ("AB100MCH", "not a date", 1e9, 1e9, 1e9),
+    ])
+    merged = by_code(compute_coefficients(cost, inventory))
+    values = merged[["CHF_per_Value", "CHF_per_m3", "CHF_per_kg"]]
+    assert not np.isinf(values.to_numpy()).any()
+
+    # Non-numeric and missing amounts count as 0, like pandas' skipna sums
+    assert merged.loc["AA100", "AvgAnnualCostCHF"] == 500.0
+    assert merged.loc["AD100", "AvgAnnualCostCHF"] == 150.0
+    assert merged.loc["AA100", "TotalWeightKG"] == 10.0
+    assert merged.loc["AB100", "TotalWeightKG"] == 5.0
+    assert merged.loc["AB100", "TotalValueCHF"] == 200.0
+
+    assert np.isnan(merged.loc["AA100", "CHF_per_m3"])
+    assert merged.loc["AA100", "CHF_per_Value"] == 1.0
+    assert merged.loc["AB100", "CHF_per_kg"] == 50.0
+    assert (merged.loc["AC100", ["CHF_per_Value", "CHF_per_m3", "CHF_per_kg"]] == 0.0).all()
+    assert values.loc["AD100"].isna().all()
+
+
+def test_published_table_drops_projects_with_nan_coefficients():
+    cost, inventory = _ledgers([
+        ("AA100MCH", "2023-03-01", 200.0, 0.0, 10.0),
+        ("AB100MCH", "2023-03-01", 100.0, 1.0, 5.0),
+        ("AC100MCH", "2023-03-01", 100.0, 1.0, 1.0),
+        ("AD100MCH", "2023-03-01", 0.0, 0.0, 0.0),
+    ])
+    table = custom_cost_coefficients(cost, inventory, mode="sequential")
+    codes = set(table["BudgetCode"])
+    assert "AA100" not in codes and "AD100" not in codes
+    assert not np.isinf(table[ROUNDED_COLS].to_numpy(dtype=float)).any()
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sequential_iqr_mask_matches_baseline_filter(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 200))
+    df = pd.DataFrame(rng.lognormal(0.0, 1.0, (n, 3)), columns=baseline.COEFFICIENTS)
+    # Outliers and ties, which sit exactly on or beyond the fences
+    df.iloc[rng.integers(0, n, max(1, n // 20)), int(rng.integers(0, 3))] *= 50
+    df.iloc[: n // 4, 1] = 1.0
+
+    expected = df
+    for col in baseline.COEFFICIENTS:
+        expected = baseline.iqr_filter(expected, col)
+    mask = iqr_mask(df.to_numpy(), "sequential")
+    assert list(df.index[mask]) == list(expected.index)
@@ -0,0 +1,38 @@
+# streamlit/tests/test_data_loader.py
+
+import pandas as pd
+
+from coefficient_engine import coefficient_inputs
+from cost_model import filter_costs
+from data_loader import load_cost_files
+
+HEADER = ["BudgetCode", "whatLVL1Desc", "Total CHF", "DecisionMoment"]
+
+
+def test_files_with_and_without_the_actuals_column(workbook, ingest_cache_dir):
+    # A file without Actuals/forecast keeps all its rows, alone or next to a
+    # file that has the column
+    with_column = workbook("mission_a.xlsx", HEADER + ["Actuals/forecast"], [
+        ["AO101", "CONSTRUCTION", 100.0, "2023-05", "Actuals"],
+        ["AO101", "CONSTRUCTION", 999.0, "2023-06", "Forecast"],
+    ])
+    without_column = workbook("mission_b.xlsx", HEADER, [["AO102", "CONSTRUCTION", 200.0, "2023-05"]])
+
+    alone = filter_costs(load_cost_files([without_column], workers=1)[0])
+    assert list(alone["BudgetCode"].astype(str)) == ["AO102"]
+
+    cost, report = load_cost_files([with_column, without_column], workers=1)
+    assert len(report) == 2
+    kept = filter_costs(cost)
+    assert sorted(zip(kept["BudgetCode"].astype(str), kept["Total CHF"])) == [("AO101", 100.0), ("AO102", 200.0)]
+
+    # The coefficient engine applies the same filter
+    inventory = pd.DataFrame({
+        "project_id": ["AO101MCH", "AO102MCH"],
+        "actual_delivery_date": "2023-06-01",
+        "price_orderline": 10.0,
+        "order_volume_m3": 1.0,
+        "order_weight_kg": 1.0,
+    })
+    merged, _ = coefficient_inputs(cost, inventory)
+    assert dict(zip(merged["BudgetCode"], merged["AvgAnnualCostCHF"])) == {"AO101": 50.0, "AO102": 100.0}
@@ -0,0 +1,22 @@
+# streamlit/tests/test_downloads.py
+
+import pandas as pd
+import pytest
+
+from config import EXCEL_MAX_ROWS, LARGE_EXPORT_ROWS
+from downloads import export_formats, serialize
+
+
+def _rows(n: int) -> pd.DataFrame:
+    return pd.DataFrame({"x": range(n)})
+
+
+def test_xlsx_is_only_offered_while_the_table_fits_one_sheet():
+    assert export_formats(_rows(LARGE_EXPORT_ROWS - 1)) == ["csv"]
+    assert "xlsx" in export_formats(_rows(EXCEL_MAX_ROWS))
+    assert export_formats(_rows(EXCEL_MAX_ROWS + 1)) == ["csv.gz", "parquet", "csv"]
+
+
+def test_xlsx_refuses_tables_over_the_sheet_limit():
+    with pytest.raises(ValueError):
+        serialize(_rows(EXCEL_MAX_ROWS + 1), "xlsx")
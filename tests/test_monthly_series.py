@@ -0,0 +1,43 @@
+# streamlit/tests/test_monthly_series.py
+
+import numpy as np
+import pandas as pd
+
+from coefficient_engine import aggregate_inventory
+from config import DEFAULT_COEFFICIENTS_PATH
+from cost_model import HOLDING_COST_BASES, estimate_holding_costs, median_rates
+from monthly_series import monthly_inventory, rolling_holding_costs
+
+
+def _last_window(inventory: pd.DataFrame, rates: pd.Series, window: int) -> pd.DataFrame:
+    monthly = rolling_holding_costs(monthly_inventory(inventory), rates, window)
+    last = monthly[monthly["Month"] == pd.Period("2024-12", freq="M")]
+    return last.assign(BudgetCode=last["BudgetCode"].astype(str)).set_index("BudgetCode")
+
+
+def test_rolling_holding_costs_are_annual(inventory_df):
+    rates = median_rates(pd.read_csv(DEFAULT_COEFFICIENTS_PATH))
+    estimate = estimate_holding_costs(aggregate_inventory(inventory_df), rates).set_index("BudgetCode")
+    costs = list(HOLDING_COST_BASES)
+
+    # A window over the coefficient years reproduces the estimate
+    full = _last_window(inventory_df, rates, 24).loc[estimate.index]
+    np.testing.assert_allclose(full[costs], estimate[costs], atol=0.005 + 1e-9)
+
+    # The rates are per unit delivered over 24 months, so a 12-month window's
+    # totals are scaled by 24 / 12
+    year = _last_window(inventory_df, rates, 12).loc[estimate.index]
+    in_2024 = inventory_df[pd.to_datetime(inventory_df["actual_delivery_date"]).dt.year == 2024]
+    totals_2024 = aggregate_inventory(in_2024, years=[2024]).set_index("BudgetCode").loc[estimate.index]
+    for cost, (total, rate) in HOLDING_COST_BASES.items():
+        np.testing.assert_allclose(year[cost], totals_2024[total] * rates[rate] * 2, rtol=1e-9)
+
+
+def test_window_longer_than_the_data_gives_an_empty_frame(inventory_df):
+    rates = median_rates(pd.read_csv(DEFAULT_COEFFICIENTS_PATH))
+    panel = monthly_inventory(inventory_df)
+    monthly = rolling_holding_costs(panel, rates, len(panel.months) + 1)
+    assert monthly.empty
+    # Month keeps its type, so the chart can still convert it to timestamps
+    assert isinstance(monthly["Month"].dtype, pd.PeriodDtype)
+    monthly.groupby("Month")[list(HOLDING_COST_BASES)].sum().index.to_timestamp()